@@ -0,0 +1,238 @@
+"""Time every indicator, region aggregation and the merge stages on synthetic data.
+
+    python -m benchmark.run small medium --output benchmark.json
+    python -m benchmark.run small --mode ssp245 --models ACCESS-CM2 CanESM5
+
+Every scale runs in its own working directory, whose config.py overrides the
+year span, scenario and CMIP6 directory of the repository config, in a fresh
+process so no cache carries over between scales.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parent.parent
+
+# resolution 为格网间距（度），years 为年数（含跨年季节的前一年）
+scales = {
+    "small": {"resolution": 1.0, "years": 4},
+    "medium": {"resolution": 0.5, "years": 10},
+    "large": {"resolution": 0.25, "years": 30},
+}
+first_year = 1991
+record_prefix = "BENCH "
+
+
+def get_indictor_names() -> list:
+    # indictors/ 下的全部指标，包括未列入 config.indictor_list 的
+    return sorted(path.stem for path in repo_root.joinpath("indictors").glob("*.py"))
+
+
+def get_config_overrides(
+    scale: dict, local_mode: str, work_dir: Path, models: list = None
+) -> str:
+    end_year = first_year + scale["years"] - 1
+    overrides = f"""
+
+# benchmark
+start_year = {first_year}
+end_year = {end_year}
+base_start_year = {first_year}
+base_end_year = {min(end_year, first_year + 29)}
+mode = {local_mode!r}
+base_mode = "era5"
+cmip6_data_dir = {str(work_dir.joinpath("cmip6"))!r}
+download_era5 = False
+"""
+    if models:
+        overrides += f"cmip6_model_list = {list(models)!r}\n"
+    return overrides
+
+
+def prepare_work_dir(work_dir: Path, scale: dict, local_mode: str, models: list):
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    work_dir.mkdir(parents=True)
+    config = repo_root.joinpath("config.py").read_text(encoding="utf-8-sig")
+    config += get_config_overrides(scale, local_mode, work_dir, models)
+    work_dir.joinpath("config.py").write_text(config, encoding="utf-8")
+    try:
+        work_dir.joinpath("static").symlink_to(
+            repo_root.joinpath("static"), target_is_directory=True
+        )
+    except OSError:
+        # Windows 下没有创建符号链接的权限时复制
+        shutil.copytree(repo_root.joinpath("static"), work_dir.joinpath("static"))
+
+
+def run_scale(name: str, work_dir: Path, local_mode: str, models: list) -> list:
+    scale = scales[name]
+    prepare_work_dir(work_dir, scale, local_mode, models)
+    command = [sys.executable, "-m", "benchmark.run", "--worker", name]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(repo_root)] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+
+    records = []
+    with open(work_dir.joinpath("benchmark.log"), "w", encoding="utf-8") as log:
+        # 工作目录在 sys.path 最前，其中的 config.py 覆盖仓库配置
+        process = subprocess.Popen(
+            command,
+            cwd=work_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=log,
+            text=True,
+        )
+        for line in process.stdout:
+            # 指标模块也会向标准输出打印，只解析计时记录
+            if not line.startswith(record_prefix):
+                continue
+            record = json.loads(line[len(record_prefix) :])
+            record["scale"] = name
+            records.append(record)
+            print(f"{name:>8} {record['stage']:<32} {record['seconds']:>10.2f}s")
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"{name} failed, see {work_dir.joinpath('benchmark.log')}")
+    return records
+
+
+def print_table(records: list, names: list):
+    stages = list(dict.fromkeys(record["stage"] for record in records))
+    seconds = {(r["scale"], r["stage"]): r["seconds"] for r in records}
+    print(f"{'stage':<32}" + "".join(f"{name:>12}" for name in names))
+    for stage in stages:
+        row = [seconds.get((name, stage)) for name in names]
+        print(
+            f"{stage:<32}"
+            + "".join(f"{'-':>12}" if v is None else f"{v:>12.2f}" for v in row)
+        )
+
+
+@contextmanager
+def timed(stage: str, **fields):
+    start = time.perf_counter()
+    yield
+    record = {"stage": stage, "seconds": time.perf_counter() - start, **fields}
+    print(record_prefix + json.dumps(record), flush=True)
+
+
+def run_worker(name: str):
+    # 在工作目录中运行，导入的 config 为覆盖后的配置
+    from config import (
+        start_year,
+        end_year,
+        base_start_year,
+        base_end_year,
+        mode,
+        cmip6_model_list,
+        region_weight_fractional,
+        region_weight_area,
+    )
+    from benchmark.synthetic import get_grid, variables, write_era5, write_cmip6
+    from utils import (
+        import_indictor,
+        get_indictor_inputs,
+        load_daily_data_single,
+        load_daily_data,
+        mean_by_region,
+        max_by_region,
+        get_region_list,
+    )
+    from common.region_weight import build_region_weight
+    from main import (
+        calculate_indictors_fused,
+        merge_indictors,
+        merge_post_process_indictors,
+    )
+
+    Path("result_data").mkdir(exist_ok=True)
+    lat, lon = get_grid(scales[name]["resolution"])
+    years = range(start_year, end_year + 1)
+    base_years = range(base_start_year, base_end_year + 1)
+    with timed("generate", lat=len(lat), lon=len(lon), years=len(years)):
+        if mode == "era5":
+            write_era5(years, lat, lon, variables)
+        else:
+            write_era5(base_years, lat, lon, ["tas", "tasmax", "tasmin", "pr"])
+            write_cmip6(mode, years, lat, lon, variables, cmip6_model_list)
+
+    indictor_list = get_indictor_names()
+    modules = {indictor: import_indictor(indictor) for indictor in indictor_list}
+    var_list = []
+    for module in modules.values():
+        var_list += [
+            v for v in get_indictor_inputs(module, mode)[0] if v not in var_list
+        ]
+    with timed("ingest", variables=var_list):
+        for variable in var_list:
+            for year in years:
+                load_daily_data_single(variable, str(year), local_mode=mode)
+
+    for indictor, module in modules.items():
+        if hasattr(module, "before_process"):
+            with timed(f"{indictor}.before_process"):
+                module.before_process()
+        with timed(f"{indictor}.calculate"):
+            module.calculate(local_mode=mode)
+
+    with timed("calculate_fused"):
+        calculate_indictors_fused(indictor_list, mode)
+
+    tas = load_daily_data(["tas"], str(start_year), local_mode=mode)["tas"]
+    with timed("region_weight"):
+        # 指标计算时已缓存权重，这里重新构建以计时
+        build_region_weight(
+            tas["lat"].values,
+            tas["lon"].values,
+            [region.geometry for region in get_region_list()],
+            fractional=region_weight_fractional,
+            area_weight=region_weight_area,
+        )
+    with timed("region_mean", shape=list(tas.shape)):
+        mean_by_region(tas)
+    with timed("region_max", shape=list(tas.shape)):
+        max_by_region(tas)
+
+    with timed("merge_indictors"):
+        merge_indictors(indictor_list, mode)
+    with timed("merge_post_process_indictors"):
+        merge_post_process_indictors(indictor_list, mode)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the indicator pipeline")
+    parser.add_argument(
+        "scales", nargs="*", metavar="scale", help=f"{', '.join(scales)}, default small"
+    )
+    parser.add_argument("--mode", default="era5", help="era5 or a CMIP6 scenario")
+    parser.add_argument("--models", nargs="+", help="CMIP6 models, default all")
+    parser.add_argument("--work-dir", default="benchmark_data")
+    parser.add_argument("--output", help="write the timings to this JSON file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        sys.exit()
+
+    names = args.scales or ["small"]
+    for name in names:
+        if name not in scales:
+            parser.error(f"unknown scale {name}, choose from {', '.join(scales)}")
+    records = []
+    for name in names:
+        work_dir = Path(args.work_dir).resolve().joinpath(name)
+        records += run_scale(name, work_dir, args.mode, args.models)
+    print_table(records, names)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2)
@@ -0,0 +1,159 @@
+"""Synthetic daily climate data in the layouts the pipeline reads.
+
+Run from the repository root (or a directory whose config.py overrides it):
+
+    python -m benchmark.synthetic era5 --start 2001 --end 2010 --resolution 0.5
+    python -m benchmark.synthetic ssp245 --start 2015 --end 2030
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from config import cmip6_model_list, deltachange_methods
+from logutil import info
+from utils import get_cf_daily_date_path, get_cmip6_data_path
+
+units = {
+    "tas": "K",
+    "tasmax": "K",
+    "tasmin": "K",
+    "pr": "mm/day",
+    "rsds": "MJ m**-2",
+    "hurs": "%",
+    "tdps": "K",
+}
+variables = list(units)
+
+# ERA5 下载范围（北、西、南、东），入库时再裁剪到县域
+default_area = [55, 70, 30, 100]
+
+
+def get_grid(resolution: float, area: list = default_area) -> tuple:
+    north, west, south, east = area
+    # 与 ERA5 一致，纬度从北到南
+    lat = np.round(np.arange(north, south - resolution / 2, -resolution), 6)
+    lon = np.round(np.arange(west, east + resolution / 2, resolution), 6)
+    return lat, lon
+
+
+def dewpoint(tas: np.ndarray, hurs: np.ndarray) -> np.ndarray:
+    # Magnus 公式反算露点，保证与 hurs 一致
+    a, b = 17.625, 243.04
+    t = tas - 273.15
+    gamma = np.log(np.clip(hurs, 1, 100) / 100) + a * t / (b + t)
+    return b * gamma / (a - gamma) + 273.15
+
+
+def generate_year(
+    year: int, lat: np.ndarray, lon: np.ndarray, seed: int = 0, bias: float = 0
+) -> xr.Dataset:
+    """One year of daily fields with a seasonal cycle and latitude gradient.
+
+    Temperature anomalies are AR(1) in time, precipitation falls on a
+    seasonally varying fraction of days with gamma-distributed amounts, and
+    radiation and humidity follow the wet days. ``bias`` shifts temperature
+    to tell models apart.
+    """
+    rng = np.random.default_rng([seed, year])
+    time = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D")
+    shape = (len(time), len(lat), len(lon))
+    season = np.cos(2 * np.pi * (time.dayofyear.values - 200) / 365.25)[:, None, None]
+    latitude = (lat - 40)[None, :, None]
+    relief = 3 * np.sin(np.radians(lon) * 8)[None, None, :]
+
+    anomaly = rng.normal(0, 1.5, shape)
+    for i in range(1, shape[0]):
+        anomaly[i] += 0.7 * anomaly[i - 1]
+    tas = 281 + bias - 0.7 * latitude - relief + (15 + 0.3 * latitude) * season
+    tas = tas + anomaly
+
+    wet = rng.random(shape) < 0.2 + 0.1 * season
+    pr = np.where(wet, rng.gamma(0.7, 5, shape), 0)
+    dtr = np.where(wet, 6, 12) + rng.normal(0, 1.5, shape)
+    rsds = (16 + 10 * season - 0.2 * latitude) * np.where(wet, 0.5, 1)
+    rsds = np.maximum(rsds + rng.normal(0, 1.5, shape), 0.5)
+    hurs = 55 - 15 * season + np.where(wet, 25, 0) + rng.normal(0, 8, shape)
+    hurs = np.clip(hurs, 5, 100)
+
+    data = {
+        "tas": tas,
+        "tasmax": tas + dtr / 2,
+        "tasmin": tas - dtr / 2,
+        "pr": pr,
+        "rsds": rsds,
+        "hurs": hurs,
+        "tdps": dewpoint(tas, hurs),
+    }
+    return xr.Dataset(
+        {
+            variable: (
+                ("time", "lat", "lon"),
+                values.astype(np.float32),
+                {"units": units[variable]},
+            )
+            for variable, values in data.items()
+        },
+        coords={"time": time, "lat": lat, "lon": lon},
+    )
+
+
+def write_era5(
+    years: range, lat: np.ndarray, lon: np.ndarray, var_list: list, seed: int = 0
+):
+    # 旧版逐年日数据的路径，由 load_daily_data_single 导入
+    for year in years:
+        ds = generate_year(year, lat, lon, seed)
+        for variable in var_list:
+            path = get_cf_daily_date_path(variable, str(year), "era5")
+            ds[[variable]].to_zarr(path, mode="w")
+        info(f"era5 {year} written")
+
+
+def write_cmip6(
+    local_mode: str,
+    years: range,
+    lat: np.ndarray,
+    lon: np.ndarray,
+    var_list: list,
+    models: list,
+    seed: int = 0,
+):
+    # 每个模式、变量一个包含全部年份的 zarr，单位同偏差订正结果
+    var_list = [v for v in var_list if v in deltachange_methods]
+    for index, model in enumerate(models):
+        ds = xr.concat(
+            [generate_year(y, lat, lon, seed + index, bias=index - 1) for y in years],
+            dim="time",
+        )
+        # add_unit_for_cmip6 将 W m-2 换算为 MJ m-2
+        ds["rsds"] = (ds["rsds"] * 1000000 / (24 * 3600)).assign_attrs(units="W m-2")
+        for variable in var_list:
+            path = get_cmip6_data_path(variable, model, local_mode)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            ds[[variable]].to_zarr(path, mode="w")
+        info(f"{local_mode} {model} written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic daily data")
+    parser.add_argument("mode", help="era5 or a CMIP6 scenario, e.g. ssp245")
+    parser.add_argument("--start", type=int, required=True)
+    parser.add_argument("--end", type=int, required=True)
+    parser.add_argument("--resolution", type=float, default=0.5)
+    parser.add_argument(
+        "--area", type=float, nargs=4, default=default_area, help="N W S E bounds"
+    )
+    parser.add_argument("--variables", nargs="+", default=variables)
+    parser.add_argument("--models", nargs="+", default=cmip6_model_list)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    years = range(args.start, args.end + 1)
+    lat, lon = get_grid(args.resolution, args.area)
+    info(f"{len(lat)} x {len(lon)} grid, {len(years)} years")
+    if args.mode == "era5":
+        write_era5(years, lat, lon, args.variables, args.seed)
+    else:
+        write_cmip6(args.mode, years, lat, lon, args.variables, args.models, args.seed)
@@ -0,0 +1,81 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from common.fingerprint import write_json_atomic
+
+cube_dims = ["indictor", "year", "lat", "lon"]
+
+
+def get_cube_coords(df: pd.DataFrame) -> dict:
+    # df 以 (lat, lon, year) 为索引，每个指标一列
+    coords = {"indictor": [str(c) for c in df.columns]}
+    for dim in ["year", "lat", "lon"]:
+        coords[dim] = np.unique(df.index.get_level_values(dim)).tolist()
+    return coords
+
+
+def fill_cube(values: np.ndarray, df: pd.DataFrame, coords: dict):
+    year, lat, lon = [
+        pd.Index(coords[dim]).get_indexer(df.index.get_level_values(dim))
+        for dim in ["year", "lat", "lon"]
+    ]
+    values[:, year, lat, lon] = df.to_numpy(dtype=values.dtype).T
+
+
+def frame_to_cube(df: pd.DataFrame) -> xr.DataArray:
+    # 以 (lat, lon, year) 为索引的表转为 float32 数组，缺少的格网为 NaN
+    if "lat" in df.columns:
+        df = df.set_index(["lat", "lon", "year"])
+    coords = get_cube_coords(df)
+    values = np.full([len(coords[dim]) for dim in cube_dims], np.nan, np.float32)
+    fill_cube(values, df, coords)
+    return xr.DataArray(values, dims=cube_dims, coords=coords)
+
+
+def write_cube(df: pd.DataFrame, path: str) -> xr.DataArray:
+    # 数组写入 path.npy、坐标写入 path.json，返回内存映射的数组
+    if "lat" in df.columns:
+        df = df.set_index(["lat", "lon", "year"])
+    coords = get_cube_coords(df)
+    # 先写临时文件再替换，读取方不会映射到写了一半的数组
+    temp_path = f"{path}.tmp.npy"
+    values = np.lib.format.open_memmap(
+        temp_path,
+        mode="w+",
+        dtype=np.float32,
+        shape=tuple(len(coords[dim]) for dim in cube_dims),
+    )
+    values[:] = np.nan
+    fill_cube(values, df, coords)
+    values.flush()
+    del values
+    os.replace(temp_path, f"{path}.npy")
+    write_json_atomic(f"{path}.json", {"dims": cube_dims, "coords": coords})
+    return load_cube(path)
+
+
+def load_cube(path: str) -> xr.DataArray:
+    # 内存映射读取，切片只在用到时才读文件
+    with open(f"{path}.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    values = np.load(f"{path}.npy", mmap_mode="r")
+    return xr.DataArray(values, dims=meta["dims"], coords=meta["coords"])
+
+
+def cube_to_frame(cube: xr.DataArray) -> pd.DataFrame:
+    # 转回与 all.csv 相同的表，全为空值的格网去掉
+    cube = cube.transpose("lat", "lon", "year", "indictor")
+    index = pd.MultiIndex.from_product(
+        [cube["lat"].values, cube["lon"].values, cube["year"].values],
+        names=["lat", "lon", "year"],
+    )
+    df = pd.DataFrame(
+        cube.values.reshape(len(index), -1).astype(float),
+        index=index,
+        columns=cube["indictor"].values.tolist(),
+    )
+    return df.dropna(how="all")
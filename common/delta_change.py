@@ -1,155 +1,230 @@
+import numpy as np
 import pandas as pd
 from common.reshape import split_data_by_column
 from utils import (
     get_outlier_result_data_path_by_mode,
     get_delta_change_result_data_path_by_mode,
     get_origin_result_data_path_by_mode,
+    get_origin_result_cube_path,
 )
 from config import indictor_list
-from logutil import info
+from logutil import info, profiled
 from common.sort import sort_by_contry
+from common.cube import load_cube, cube_to_frame
+
+
+# 按窗口缩放订正的指标，其中 rsds 最终用 2020-2025 年的极值归一化
+scale_indictor_list = [
+    "rsds",
+    "hur",
+    "pr",
+    "cwd",
+    "cdd",
+    "r10",
+    "r20",
+    "r95p",
+    "sdii",
+    "rx1day",
+    "rx5day",
+    "tnn",
+]
+old_indictor_list = ["rsds"]
+
+
+def get_group_keys(df: pd.DataFrame, index_col: list) -> pd.Index:
+    if len(index_col) == 1:
+        return pd.Index(df[index_col[0]])
+    return pd.MultiIndex.from_frame(df[index_col])
+
+
+def group_stat(
+    values: np.ndarray, codes: np.ndarray, count: int, how: str
+) -> np.ndarray:
+    # 每组的统计量（忽略缺测），没有数据的组为 NaN
+    selected = codes >= 0
+    stat = pd.Series(values[selected]).groupby(codes[selected]).agg(how)
+    return stat.reindex(range(count)).to_numpy(dtype=float)
+
+
+# df 与 base_df 各行对应到 index_col 的分组，df 按分组排序后整列计算
+
+
+class DeltaGroups:
+    def __init__(self, df: pd.DataFrame, base_df: pd.DataFrame, index_col):
+        index_col = [index_col] if isinstance(index_col, str) else list(index_col)
+        self.df = (
+            df.dropna(subset=index_col)
+            .sort_values(index_col, kind="stable")
+            .reset_index(drop=True)
+        )
+        self.base_df = base_df
+        self.keys = get_group_keys(self.df, index_col).unique()
+        self.count = len(self.keys)
+        self.codes = self.keys.get_indexer(get_group_keys(self.df, index_col))
+        self.base_codes = self.keys.get_indexer(get_group_keys(base_df, index_col))
+        missing = np.setdiff1d(np.arange(self.count), self.base_codes)
+        if len(missing):
+            raise KeyError(self.keys[missing[0]])
+        self.years = self.df["year"].to_numpy()
+
+    def stat(self, variable: str, how: str, selected=None) -> np.ndarray:
+        values = self.df[variable].to_numpy()
+        codes = self.codes if selected is None else np.where(selected, self.codes, -1)
+        return group_stat(values, codes, self.count, how)
+
+    def base_stat(self, variable: str, how: str) -> np.ndarray:
+        values = self.base_df[variable].to_numpy()
+        return group_stat(values, self.base_codes, self.count, how)
+
+
+def get_first_range(
+    groups: DeltaGroups, variable: str, start: int, step: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # 每组从 start 起第一个极差不为 0 的窗口的极值，及该窗口是否到末年
+    last_year = group_stat(groups.years, groups.codes, groups.count, "max")
+    window_count = int(max(np.ceil((np.nanmax(last_year) - start) / step), 0))
+    window_start = start + step * np.arange(window_count)
+    valid = window_start[None, :] < last_year[:, None]
+    if not valid[:, 0].all():
+        key = groups.keys[np.flatnonzero(~valid[:, 0])[0]]
+        raise ValueError(f"Can't find valid data for {variable} in {key}")
+
+    # 每组每个窗口的极值，空窗口为 NaN
+    window = (groups.years - start) // step
+    selected = (groups.years >= start) & (window < window_count)
+    codes = np.where(selected, groups.codes * window_count + window, -1)
+    values = groups.df[variable].to_numpy()
+    size = groups.count * window_count
+    shape = (groups.count, window_count)
+    window_min = group_stat(values, codes, size, "min").reshape(shape)
+    window_max = group_stat(values, codes, size, "max").reshape(shape)
+
+    found = valid & ~(window_max - window_min == 0)
+    chosen = np.where(
+        found.any(axis=1), found.argmax(axis=1), valid.sum(axis=1) - 1
+    )
+    rows = np.arange(groups.count)
+    reach_end = window_start[chosen] + step >= last_year
+    return window_min[rows, chosen], window_max[rows, chosen], reach_end
 
 
 def delta_change_by_scale(
-    df: pd.DataFrame,
-    base_df: pd.DataFrame,
+    groups: DeltaGroups,
     variable: str,
     start: int = 2015,
     step: int = 5,
     scale: float = 1.0,
-) -> pd.DataFrame:
-    for year in range(start, df["year"].max(), step):
-        start_year = year
-        end_year = year + step
-        first_df = df[(df["year"] >= start_year) & (df["year"] < end_year)]
-        first_min = first_df[variable].min()
-        first_max = first_df[variable].max()
-        if first_max - first_min != 0 and first_max - first_min != 0.0:
-            break
-
-    if end_year >= df["year"].max():
-        first_min = df[variable].min()
-        first_max = df[variable].max()
-        if first_max - first_min == 0 or first_max - first_min == 0.0:
-            if first_max == 0 and first_min == 0.0:
-                return df[variable]
-
-            raise ValueError(
-                f"Can't find valid data for {variable} in {df['name'].iloc[0]}"
-            )
-
-    base_min = base_df[variable].min()
-    base_max = base_df[variable].max()
-    scale_factor = (base_max - base_min) / (first_max - first_min)
+) -> np.ndarray:
+    first_min, first_max, reach_end = get_first_range(groups, variable, start, step)
+    # 窗口到末年仍无变化时用全部年份的极值
+    first_min = np.where(reach_end, groups.stat(variable, "min"), first_min)
+    first_max = np.where(reach_end, groups.stat(variable, "max"), first_max)
+    flat = reach_end & (first_max - first_min == 0)
+    keep = flat & (first_max == 0) & (first_min == 0)
+    if (flat & ~keep).any():
+        key = groups.keys[np.flatnonzero(flat & ~keep)[0]]
+        raise ValueError(f"Can't find valid data for {variable} in {key}")
+
+    base_min = groups.base_stat(variable, "min")
+    base_max = groups.base_stat(variable, "max")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale_factor = (base_max - base_min) / (first_max - first_min)
     offset = base_min - scale_factor * first_min * scale
     info(
-        f"start delta change for {variable} base {start_year} to {end_year}, scale_factor {scale_factor}. offset {offset}"
+        f"delta change for {variable}: {groups.count - keep.sum()} groups scaled, "
+        f"{keep.sum()} all zero groups kept"
     )
-    result = df[variable] * scale_factor * scale + offset
-    if base_max < 0:
-        return -1 * result.abs()
-    else:
-        return result.abs()
+
+    values = groups.df[variable].to_numpy()
+    codes = groups.codes
+    with np.errstate(invalid="ignore"):
+        result = np.abs(values * scale_factor[codes] * scale + offset[codes])
+    result = np.where(base_max[codes] < 0, -result, result)
+    return np.where(keep[codes], values, result)
 
 
 def delta_change_by_mean(
-    df: pd.DataFrame,
-    base_df: pd.DataFrame,
+    groups: DeltaGroups,
     variable: str,
     start: int = 2015,
     step: int = 5,
-):
-
-    base_mean = base_df[variable].mean()
-    start_mean = df[(df["year"] >= start) & (df["year"] < start + step)][
-        variable
-    ].mean()
-    result = df[variable] - start_mean + base_mean
-    return result.abs()
+) -> np.ndarray:
+    base_mean = groups.base_stat(variable, "mean")
+    selected = (groups.years >= start) & (groups.years < start + step)
+    start_mean = groups.stat(variable, "mean", selected)
+    values = groups.df[variable].to_numpy()
+    return np.abs(values - start_mean[groups.codes] + base_mean[groups.codes])
 
 
-def delta_change_old(
-    df: pd.DataFrame, base_df: pd.DataFrame, variable: str
-) -> pd.DataFrame:
+def delta_change_old(groups: DeltaGroups, variable: str) -> np.ndarray:
     # 假设 df 和 base_df 中有一个时间列 'year'
-    df_2020_2025 = df[(df["year"] >= 2020) & (df["year"] <= 2025)]
+    selected = (groups.years >= 2020) & (groups.years <= 2025)
 
     # 计算 2020-2025 年的最小值和最大值
-    base_min = base_df[variable].min()
-    base_max = base_df[variable].max()
-
-    df_min_2020_2025 = df_2020_2025[variable].min()
-    df_max_2020_2025 = df_2020_2025[variable].max()
-
-    # 应用最小-最大归一化公式，将 2020-2025 年的数据缩放到新的范围
-    df.loc[(df["year"] >= 2020) & (df["year"] <= 2025), variable] = (
-        (df_2020_2025[variable] - df_min_2020_2025)
-        / (df_max_2020_2025 - df_min_2020_2025)
-    ) * (base_max - base_min) + base_min
-
-    # 计算缩放比例
-    scale_factor = (base_max - base_min) / (df_max_2020_2025 - df_min_2020_2025)
-    offset = base_min - scale_factor * df_min_2020_2025
-
-    # 将缩放比例应用到其他年份的数据
-    df.loc[(df["year"] < 2020) | (df["year"] > 2025), variable] = (
-        df.loc[(df["year"] < 2020) | (df["year"] > 2025), variable] * scale_factor
-        + offset
-    )
-
-    return df[variable]
-
-
-def delta_change_indictor(
-    df: pd.DataFrame, base_df: pd.DataFrame, mode: str
-) -> pd.DataFrame:
-    result = df.copy()
-    for indictor in ["rsds", "hur", "pr", "cwd", "cdd", "r10", "r20", "r95p","sdii", "rx1day", "rx5day", "tnn"]:
-        if indictor in df.columns:
-            result[indictor] = delta_change_by_scale(df, base_df, indictor)
-
-    for indictor in ["rsds"]:
-        if indictor in df.columns:
-            result[indictor] = delta_change_old(df, base_df, indictor)
-
-    return result
+    base_min = groups.base_stat(variable, "min")
+    base_max = groups.base_stat(variable, "max")
+    df_min = groups.stat(variable, "min", selected)
+    df_max = groups.stat(variable, "max", selected)
+
+    values = groups.df[variable].to_numpy()
+    codes = groups.codes
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 应用最小-最大归一化公式，将 2020-2025 年的数据缩放到新的范围
+        normalized = ((values - df_min[codes]) / (df_max - df_min)[codes]) * (
+            base_max - base_min
+        )[codes] + base_min[codes]
+
+        # 计算缩放比例，应用到其他年份的数据
+        scale_factor = (base_max - base_min) / (df_max - df_min)
+        offset = base_min - scale_factor * df_min
+        shifted = values * scale_factor[codes] + offset[codes]
+    return np.where(selected, normalized, shifted)
 
 
 def delta_change(
     df: pd.DataFrame, base_df: pd.DataFrame, mode, index_col
 ) -> pd.DataFrame:
-    base_groups = dict(list(base_df.groupby(index_col)))
-    df = df.groupby(index_col).apply(
-        lambda x: delta_change_indictor(
-            x,
-            base_groups[x.name],
-            mode,
-        )
-    )
+    # 所有分组一次计算，结果按分组排序，同 groupby(index_col).apply
+    groups = DeltaGroups(df, base_df, index_col)
+    result = groups.df.copy()
+    for indictor in scale_indictor_list:
+        if indictor in result.columns:
+            result[indictor] = delta_change_by_scale(groups, indictor)
 
-    df = df.reset_index(drop=True)
-    return df
+    for indictor in old_indictor_list:
+        if indictor in result.columns:
+            result[indictor] = delta_change_old(groups, indictor)
 
+    return result
 
+
+@profiled
 def process_delta_change_all(post_process: bool = False) -> pd.DataFrame:
     if post_process:
-        get_era5_data_path = get_outlier_result_data_path_by_mode
-        get_cmip6_data_path = lambda x, local_mode: get_origin_result_data_path_by_mode(
-            x + "_post_process", local_mode
+        load_era5_data = lambda local_mode: pd.read_csv(
+            get_outlier_result_data_path_by_mode("all", local_mode)
+        )
+        load_cmip6_data = lambda local_mode: pd.read_csv(
+            get_origin_result_data_path_by_mode("all_post_process", local_mode)
         )
         index = "name"
     else:
-        get_cmip6_data_path = get_origin_result_data_path_by_mode
-        get_era5_data_path = get_origin_result_data_path_by_mode
+        # 格网结果读取合并后的数组
+        load_cmip6_data = lambda local_mode: cube_to_frame(
+            load_cube(get_origin_result_cube_path("all", local_mode))
+        ).reset_index()
+        load_era5_data = load_cmip6_data
         index = ["lat", "lon"]
 
     for mode in ["ssp126", "ssp245", "ssp370", "ssp585"]:
         info(f"Processing delta change for {mode}")
-        df = pd.read_csv(get_cmip6_data_path("all", mode))
-        base_df = pd.read_csv(get_era5_data_path("all", "era5"))
+        df = load_cmip6_data(mode)
+        base_df = load_era5_data("era5")
 
         result = delta_change(df, base_df, mode, index)
-        sort_by_contry(result).to_csv(
+        # 格网结果没有县名，保持按经纬度排序
+        output = sort_by_contry(result) if post_process else result
+        output.to_csv(
             get_delta_change_result_data_path_by_mode("all", mode),
             float_format="%.2f",
             index=False,
@@ -0,0 +1,59 @@
+import numpy as np
+import xarray as xr
+
+
+# 逐个模式累加的集合统计，内存中只有累加量和当前模式；
+# 各模式按外连接对齐并跳过缺测，同拼接 model 维后求平均
+class EnsembleAccumulator:
+    def __init__(self, spread: bool = False):
+        self.spread = spread
+        self.dtypes = {}
+        self.total = None
+        self.count = None
+        self.square = None
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, ds: xr.Dataset):
+        for name in ds.data_vars:
+            self.dtypes.setdefault(name, ds[name].dtype)
+        ds = ds.astype("float64")
+
+        if self.total is None:
+            self.total = ds.fillna(0)
+            self.count = ds.notnull().astype("int32")
+            if self.spread:
+                self.square = (ds * ds).fillna(0)
+                self.minimum = ds
+                self.maximum = ds
+            return
+
+        if self.spread:
+            total, count, square, minimum, maximum, ds = xr.align(
+                self.total, self.count, self.square, self.minimum, self.maximum, ds,
+                join="outer",
+            )
+            self.square = square.fillna(0) + (ds * ds).fillna(0)
+            self.minimum = np.fmin(minimum, ds)
+            self.maximum = np.fmax(maximum, ds)
+        else:
+            total, count, ds = xr.align(self.total, self.count, ds, join="outer")
+        self.total = total.fillna(0) + ds.fillna(0)
+        self.count = count.fillna(0).astype("int32") + ds.notnull().astype("int32")
+
+    def result(self) -> xr.Dataset:
+        mean = (self.total / self.count).where(self.count > 0)
+        result = mean.copy()
+        if self.spread:
+            variance = (self.square / self.count).where(self.count > 0) - mean * mean
+            std = np.sqrt(variance.clip(min=0))
+            for name in mean.data_vars:
+                result[f"{name}_min"] = self.minimum[name]
+                result[f"{name}_max"] = self.maximum[name]
+                result[f"{name}_std"] = std[name]
+
+        for name in result.data_vars:
+            dtype = self.dtypes.get(name, self.dtypes.get(name.rsplit("_", 1)[0]))
+            if dtype is not None and np.issubdtype(dtype, np.floating):
+                result[name] = result[name].astype(dtype)
+        return result
@@ -0,0 +1,90 @@
+import os
+
+import dask
+import psutil
+
+from config import (
+    dask_scheduler,
+    dask_workers,
+    dask_memory_limit,
+    year_workers,
+)
+from logutil import info
+
+# 每个并发任务同时持有的分块份数（输入、中间结果和输出）
+chunk_copies = 8
+
+execution_state = {}
+
+
+def get_worker_count() -> int:
+    return dask_workers or os.cpu_count() or 1
+
+
+def get_memory_limit() -> int:
+    # dask_memory_limit 不大于 1 时按物理内存比例计，否则为字节数
+    memory = psutil.virtual_memory()
+    if dask_memory_limit is None:
+        return memory.available
+    if dask_memory_limit <= 1:
+        return int(memory.total * dask_memory_limit)
+    return int(dask_memory_limit)
+
+
+def get_concurrency() -> int:
+    # 按年份多进程时每个进程内是同步调度
+    if year_workers > 1:
+        return year_workers
+    return get_worker_count()
+
+
+def get_chunk_memory() -> int:
+    return get_memory_limit() // (get_concurrency() * chunk_copies)
+
+
+def fits_in_memory(nbytes: int) -> bool:
+    return nbytes * chunk_copies <= get_memory_limit() // get_concurrency()
+
+
+def get_time_chunk(bytes_per_step: int, multiple: int = 1) -> int:
+    # 内存预算内每块的时间步数，按 multiple（如 zarr 分块长度）向下取整
+    steps = max(1, get_chunk_memory() // max(1, bytes_per_step))
+    return max(multiple, steps - steps % multiple)
+
+
+def setup_execution():
+    if "scheduler" in execution_state:
+        return
+
+    workers = get_worker_count()
+    memory = get_memory_limit()
+    if dask_scheduler == "distributed":
+        try:
+            from dask.distributed import Client, LocalCluster
+        except ImportError:
+            raise ValueError(
+                'dask_scheduler = "distributed" needs the distributed package, '
+                "install it or choose another scheduler in config.py"
+            )
+
+        cluster = LocalCluster(
+            n_workers=workers, threads_per_worker=1, memory_limit=memory // workers
+        )
+        execution_state["cluster"] = cluster
+        execution_state["client"] = Client(cluster)
+    else:
+        dask.config.set(scheduler=dask_scheduler, num_workers=workers)
+
+    execution_state["scheduler"] = dask_scheduler
+    info(
+        f"dask {dask_scheduler} scheduler, {workers} workers, "
+        f"{memory / 2**30:.1f} GiB memory limit"
+    )
+
+
+def teardown_execution():
+    # 关闭本地集群，避免其工作进程在运行结束后残留
+    if "client" in execution_state:
+        execution_state.pop("client").close()
+        execution_state.pop("cluster").close()
+    execution_state.pop("scheduler", None)
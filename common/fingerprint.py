@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sys
+import types
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parent.parent
+
+
+def hash_value(value) -> str:
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_repo_file(value) -> Path:
+    # 对象所属模块在仓库内的源文件，第三方库返回 None
+    if isinstance(value, types.ModuleType):
+        module = value
+    else:
+        module = sys.modules.get(getattr(value, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if path is None:
+        return None
+    path = Path(path).resolve()
+    if repo_root not in path.parents:
+        return None
+    return path
+
+
+def get_code_fingerprint(module: types.ModuleType) -> dict:
+    # 模块及其间接引用的仓库内模块的源码哈希
+    files = {}
+    pending = [(Path(module.__file__).resolve(), module)]
+    while pending:
+        path, current = pending.pop()
+        if path in files:
+            continue
+        files[path] = hash_file(path)
+        for value in vars(current).values():
+            dependency = get_repo_file(value)
+            if dependency is None or dependency in files:
+                continue
+            name = value.__name__ if isinstance(value, types.ModuleType) else None
+            name = name or value.__module__
+            pending.append((dependency, sys.modules[name]))
+
+    return {
+        path.relative_to(repo_root).as_posix(): digest
+        for path, digest in sorted(files.items())
+    }
+
+
+def write_json_atomic(path: str, value):
+    # 先写临时文件再替换，中断时不会留下不完整的文件
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+# 各产物生成时的输入、参数和代码指纹，与当前指纹一致时才视为有效
+
+
+class FingerprintStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if Path(path).exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def is_current(self, target: str, key: str) -> bool:
+        return Path(target).exists() and self.entries.get(str(target)) == key
+
+    def record(self, target: str, key: str):
+        # 重新读取，保留其他实例在此期间写入的记录
+        if Path(self.path).exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self.entries[str(target)] = key
+        write_json_atomic(self.path, self.entries)
@@ -1,8 +1,7 @@
 from download.era5 import get_era5_data
 from utils import (
     range_data,
-    save_to_zarr,
-    get_cf_daily_date_path,
+    write_daily_store,
     get_origin_result_data_path,
 )
 import xarray as xr
@@ -12,7 +11,9 @@ from xclim.indicators.atmos import relative_humidity_from_dewpoint
 def stat(ds: xr.Dataset):
     hur = relative_humidity_from_dewpoint(tas=ds["tas"], tdps=ds["tdps"])
 
-    save_to_zarr(hur, get_cf_daily_date_path("hur", hur.time.dt.year.values[0], local_mode="era5"))
+    write_daily_store(
+        hur.to_dataset(name="hur"), "hur", hur.time.dt.year.values[0], local_mode="era5"
+    )
     return None
 
 
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+# 坐标列保留 float64，其余浮点列以 float32 存储
+coordinate_columns = ["lat", "lon"]
+
+
+# 每个指标每年一个 CSV
+class CsvIntermediateStore:
+    def __init__(self, path_fn: callable):
+        self.path_fn = path_fn
+
+    def write(self, variable: str, year, df: pd.DataFrame, index: bool = True):
+        df.to_csv(self.path_fn(variable, str(year)), index=index)
+
+    def read(self, variable: str, year) -> pd.DataFrame:
+        return pd.read_csv(self.path_fn(variable, year))
+
+    def read_years(self, variable: str, years) -> pd.DataFrame:
+        df_list = []
+        for year in years:
+            df = pd.read_csv(self.path_fn(variable, year))
+            df["year"] = year
+            df_list.append(df)
+        return pd.concat(df_list)
+
+    def write_merged(self, variable: str, df: pd.DataFrame):
+        df.to_csv(self.path_fn(variable))
+
+
+# 按 {root}/{variable}/mode={mode}/year={year} 分区的 parquet，
+# 一次扫描读取指标的所有年份
+class ParquetIntermediateStore:
+    def __init__(self, root: str, mode: str):
+        self.root = root
+        self.mode = mode
+
+    def get_dataset_path(self, variable: str) -> Path:
+        return Path(self.root).joinpath(variable).joinpath(f"mode={self.mode}")
+
+    def write(self, variable: str, year, df: pd.DataFrame, index: bool = True):
+        df = df.reset_index() if index else df.copy()
+        for column in df.columns:
+            if column not in coordinate_columns and df[column].dtype == np.float64:
+                df[column] = df[column].astype(np.float32)
+
+        path = self.get_dataset_path(variable).joinpath(f"year={year}")
+        path.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, path.joinpath("part-0.parquet"))
+
+    def read(self, variable: str, year) -> pd.DataFrame:
+        path = self.get_dataset_path(variable).joinpath(f"year={year}")
+        return pq.read_table(path.joinpath("part-0.parquet")).to_pandas()
+
+    def read_years(self, variable: str, years) -> pd.DataFrame:
+        years = list(years)
+        dataset = pads.dataset(
+            self.get_dataset_path(variable),
+            format="parquet",
+            partitioning=pads.partitioning(
+                pa.schema([("year", pa.int64())]), flavor="hive"
+            ),
+        )
+        table = dataset.to_table(filter=pads.field("year").isin(years))
+        df = table.to_pandas()
+        missing = sorted(set(years) - set(df["year"].unique()))
+        if len(missing) != 0:
+            raise FileNotFoundError(
+                f"{variable} {self.mode} intermediate data missing for {missing}"
+            )
+        return df.sort_values("year", kind="stable").reset_index(drop=True)
+
+    def write_merged(self, variable: str, df: pd.DataFrame):
+        # 合并结果即整个数据集的扫描，不再另存一份
+        pass
@@ -1,126 +1,50 @@
 import pandas as pd
 import numpy as np
-from scipy import stats
 from utils import get_outlier_result_data_path
-from config import max_outlier
+from config import max_outlier, mode
 from common.reshape import split_data_by_column
+from logutil import info, warn, profiled
 
-def outliers_framework(df: pd.DataFrame, process, variable: str, group_by):
-    df = df.astype(float)
-    grouped = df[variable].groupby(group_by)
 
-    df_list = []
+def get_group_median(df: pd.DataFrame, group_by) -> pd.DataFrame:
+    return df.groupby(level=group_by).transform("median")
 
-    grouped.apply(process, df_list)
-    result = pd.concat(df_list)
-    return result.rename(variable)
 
+def score_zcore(df: pd.DataFrame, group_by) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # 同 scipy.stats.zscore（ddof=0），组内有缺测时整组不判异常
+    grouped = df.groupby(level=group_by)
+    mean = grouped.transform("mean")
+    std = grouped.transform("std", ddof=0)
+    has_nan = df.isna().groupby(level=group_by).transform("any")
+    score = ((df - mean) / std).abs().mask(has_nan)
+    return score, pd.DataFrame(1.0, index=df.index, columns=df.columns)
 
-def df_outliers_zcore(
-    df: pd.DataFrame,
-    variable: str = "value",
-    fill_method="mean",
-    group_by="name",
-    threshold=3,
-):
-    def process(x: pd.Series, df_list: list):
-        z_scores = stats.zscore(x)
-        outliers = np.abs(z_scores) > threshold
-        if len(x[outliers]) > max_outlier:
-            raise Exception(f"Too many outliers({len(outliers)})")
-
-        if fill_method == "mean":
-            x[outliers] = x[~outliers].mean()
-        elif fill_method == "median":
-            x[outliers] = x[~outliers].median()
-        elif fill_method == "none":
-            x[outliers] = None
-        else:
-            x = x.drop(x[outliers].index)
-        df_list.append(x)
 
-    return outliers_framework(df, process, variable, group_by)
+def score_iqr(df: pd.DataFrame, group_by) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # 超出 [q1 - t * iqr, q3 + t * iqr] 即 max(q1 - x, x - q3) > t * iqr
+    grouped = df.groupby(level=group_by)
+    q1 = grouped.transform("quantile", 0.25)
+    q3 = grouped.transform("quantile", 0.75)
+    score = np.maximum(q1 - df, df - q3)
+    return score, q3 - q1
 
 
-def df_outliers_iqr(
-    df: pd.DataFrame,
-    variable: str = "value",
-    fill_method="mean",
-    group_by="name",
-    threshold=1.5,
-) -> pd.DataFrame:
-    def process(x: pd.Series, df_list: list):
-        q1 = x.quantile(0.25)
-        q3 = x.quantile(0.75)
-
-        iqr = q3 - q1
-
-        lower_bound = q1 - threshold * iqr
-        upper_bound = q3 + threshold * iqr
-        if len(x[(x < lower_bound) | (x > upper_bound)]) > max_outlier:
-            raise Exception(
-                f"Too many outliers({len(x[(x < lower_bound) | (x > upper_bound)])})"
-            )
-
-        if fill_method == "mean":
-            x[(x < lower_bound) | (x > upper_bound)] = x.mean()
-        elif fill_method == "median":
-            x[(x < lower_bound) | (x > upper_bound)] = x.median()
-        elif fill_method == "none":
-            x[(x < lower_bound) | (x > upper_bound)] = None
-        else:
-            x = x.drop(x[(x < lower_bound) | (x > upper_bound)].index)
-        df_list.append(x)
-
-    return outliers_framework(df, process, variable, group_by)
+def score_mad(df: pd.DataFrame, group_by) -> tuple[pd.DataFrame, pd.DataFrame]:
+    deviation = (df - get_group_median(df, group_by)).abs()
+    return deviation, get_group_median(deviation, group_by)
 
 
-def df_outliers_mad(
-    df: pd.DataFrame,
-    variable: str = "value",
-    fill_method="mean",
-    group_by="name",
-    threshold=3,
-) -> pd.DataFrame:
-    def process(x: pd.Series, df_list: list):
-        median = x.median()
-
-        mad = (x - median).abs().median()
-        outlier = np.abs(x - median) > threshold * mad
-        if len(x[outlier]) > max_outlier:
-            raise Exception(f"Too many outliers({len(x[outlier])})")
-
-        if fill_method == "mean":
-            x.mask(outlier, x.mean(), inplace=True)
-        elif fill_method == "median":
-            x.mask(outlier, x.median(), inplace=True)
-        elif fill_method == "none":
-            x.mask(outlier, None, inplace=True)
-        else:
-            x = x.drop(outlier.index)
-        df_list.append(x)
+def score_none(df: pd.DataFrame, group_by) -> tuple[pd.DataFrame, pd.DataFrame]:
+    empty = pd.DataFrame(np.nan, index=df.index, columns=df.columns)
+    return empty, empty
 
-    return outliers_framework(df, process, variable, group_by)
 
-
-def df_outliers_none(
-    df: pd.DataFrame,
-    variable: str = "value",
-    fill_method="mean",
-    group_by="name",
-    threshold=3,
-) -> pd.DataFrame:
-    def process(x: pd.Series, df_list: list):
-        df_list.append(x)
-
-    return outliers_framework(df, process, variable, group_by)
-
-
-df_outlier_method = {
-    "iqr": df_outliers_iqr,
-    "mad": df_outliers_mad,
-    "none": df_outliers_none,
-    "zcore": df_outliers_zcore,
+# 每种方法给出离差和尺度，离差 > threshold * 尺度 即为异常值
+outlier_score_method = {
+    "iqr": score_iqr,
+    "mad": score_mad,
+    "none": score_none,
+    "zcore": score_zcore,
 }
 
 outlier_fill_method = {
@@ -130,6 +54,49 @@ outlier_fill_method = {
 }
 
 
+def get_outliers(
+    score: pd.DataFrame, scale: pd.DataFrame, threshold: pd.Series
+) -> pd.DataFrame:
+    return score.gt(scale.mul(threshold, axis=1))
+
+
+def search_threshold(
+    score: pd.DataFrame, scale: pd.DataFrame, thresholds: np.ndarray, group_by
+) -> pd.Series:
+    # 每列取各组异常值都不超过 max_outlier 个的最小阈值，
+    # 只需比较每组第 max_outlier + 1 大的得分
+    rank = score.groupby(level=group_by).rank(method="first", ascending=False)
+    kth = rank == max_outlier + 1
+    result = {}
+    for column in score.columns:
+        selected = kth[column].values
+        limit = score[column].values[selected]
+        group_scale = scale[column].values[selected]
+        failed = (limit[None, :] > thresholds[:, None] * group_scale[None, :]).any(
+            axis=1
+        )
+        passed = np.flatnonzero(~failed)
+        result[column] = thresholds[passed[0]] if len(passed) else np.nan
+    return pd.Series(result, dtype=float)
+
+
+def fill_outliers(
+    df: pd.DataFrame,
+    outliers: pd.DataFrame,
+    method: str,
+    fill_method: str,
+    group_by,
+) -> pd.DataFrame:
+    if fill_method not in ["mean", "median"]:
+        # none 置空，其余填充方式由调用方删除置空的行
+        return df.mask(outliers)
+
+    # z-score 用非异常值的统计量填充，其余方法用全部数据的统计量
+    values = df.mask(outliers) if method == "zcore" else df
+    fill = values.groupby(level=group_by).transform(fill_method)
+    return df.mask(outliers, fill)
+
+
 def process_outlier(
     df: pd.DataFrame,
     variable: str,
@@ -137,18 +104,14 @@ def process_outlier(
     threshold: float = 3,
     fill_method: str = "median",
 ) -> pd.DataFrame:
-    process = df_outlier_method[method]
-
-    result = process(
-        df,
-        variable=variable,
-        group_by="name",
-        fill_method=fill_method,
-        threshold=threshold,
-    )
-    result = result.reset_index()
-
-    return result
+    data = df[[variable]].astype(float)
+    score, scale = outlier_score_method[method](data, "name")
+    outliers = get_outliers(score, scale, pd.Series({variable: threshold}))
+    result = fill_outliers(data, outliers, method, fill_method, "name")
+    if fill_method not in outlier_fill_method:
+        result = result.dropna()
+    # 与按县分组拼接的结果顺序一致
+    return result.reset_index().sort_values("name", kind="stable", ignore_index=True)
 
 
 def process_outlier_grid(
@@ -159,23 +122,46 @@ def process_outlier_grid(
     end_threshold: float = 10,
     stop: float = 0.5,
 ):
-    for i in np.arange(start_threshold, end_threshold, stop):
-        try:
-            return process_outlier(df, variable, method, i)
-        except Exception as e:
-            print(f"Info: {variable} {method} failed {i}: {e}")
-            continue
-
-def process_outlier_grid_all(df: pd.DataFrame, method: str = "mad") -> pd.DataFrame:
+    thresholds = np.arange(start_threshold, end_threshold, stop)
+    data = df[[variable]].astype(float)
+    score, scale = outlier_score_method[method](data, "name")
+    threshold = search_threshold(score, scale, thresholds, "name")[variable]
+    if np.isnan(threshold):
+        return None
+    return process_outlier(df, variable, method, threshold)
+
+
+@profiled
+def process_outlier_grid_all(
+    df: pd.DataFrame,
+    method: str = "mad",
+    local_mode: str = mode,
+    start_threshold: float = 0,
+    end_threshold: float = 10,
+    stop: float = 0.5,
+    fill_method: str = "median",
+) -> pd.DataFrame:
+    # 一次算出所有县和指标的统计量，每列取使每县异常值不超过 max_outlier 个的
+    # 最小阈值，没有这样的阈值时保持原值
+    thresholds = np.arange(start_threshold, end_threshold, stop)
+    data = df.astype(float)
+    score, scale = outlier_score_method[method](data, "name")
+    threshold = search_threshold(score, scale, thresholds, "name")
+    for variable, value in threshold.items():
+        if np.isnan(value):
+            warn(f"{variable} {method} error: too many outliers at every threshold")
+        else:
+            info(f"{variable} {method} success, threshold {value}")
+
+    columns = threshold.dropna().index
+    outliers = get_outliers(score[columns], scale[columns], threshold[columns])
     total_result = df.copy()
-    for variable in df.columns:
-        result = process_outlier_grid(df, variable, method)
-        if result is None:
-            print(f"{variable} {method} error")
-            continue
-        total_result[variable] = result.set_index(["name", "year"])[variable]
-        print(f"{variable} {method} success")
-
-    total_result.to_csv(get_outlier_result_data_path(f"all"), float_format="%.2f")
-    split_data_by_column(df, get_outlier_result_data_path())
+    total_result[columns] = fill_outliers(
+        data[columns], outliers, method, fill_method, "name"
+    )
+
+    total_result.to_csv(
+        get_outlier_result_data_path(f"all", local_mode), float_format="%.2f"
+    )
+    split_data_by_column(df, get_outlier_result_data_path(local_mode=local_mode))
     return total_result
@@ -0,0 +1,162 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import shapely
+from scipy import sparse
+
+from config import intermediate_data_dir
+from logutil import info
+
+region_weight_cache = {}
+
+
+def get_cell_edges(coord: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # 以相邻格点中点作为格网边界，首尾格网按相邻间距外推
+    coord = np.asarray(coord, dtype=float)
+    if len(coord) == 1:
+        return coord - 0.5, coord + 0.5
+    mid = (coord[1:] + coord[:-1]) / 2
+    first = coord[0] - (mid[0] - coord[0])
+    last = coord[-1] + (coord[-1] - mid[-1])
+    edges = np.concatenate([[first], mid, [last]])
+    lower = np.minimum(edges[:-1], edges[1:])
+    upper = np.maximum(edges[:-1], edges[1:])
+    return lower, upper
+
+
+def build_region_weight(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    geometries: list,
+    fractional: bool = True,
+    area_weight: bool = False,
+) -> sparse.csr_matrix:
+    # 规则格网的 (region, lat * lon) 权重矩阵；fractional 时按覆盖比例，
+    # 否则格网中心在区域内计满（同 rio.clip），area_weight 再乘 cos(lat)
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    lat_lower, lat_upper = get_cell_edges(lat)
+    lon_lower, lon_upper = get_cell_edges(lon)
+    lat_scale = np.cos(np.deg2rad(lat)) if area_weight else np.ones(len(lat))
+
+    rows, cols, data = [], [], []
+    for row, geometry in enumerate(geometries):
+        minx, miny, maxx, maxy = geometry.bounds
+        lat_index = np.nonzero((lat_upper > miny) & (lat_lower < maxy))[0]
+        lon_index = np.nonzero((lon_upper > minx) & (lon_lower < maxx))[0]
+        if len(lat_index) == 0 or len(lon_index) == 0:
+            continue
+
+        lat_grid, lon_grid = np.meshgrid(lat_index, lon_index, indexing="ij")
+        lat_grid = lat_grid.ravel()
+        lon_grid = lon_grid.ravel()
+        shapely.prepare(geometry)
+        if fractional:
+            boxes = shapely.box(
+                lon_lower[lon_grid],
+                lat_lower[lat_grid],
+                lon_upper[lon_grid],
+                lat_upper[lat_grid],
+            )
+            weight = shapely.area(shapely.intersection(boxes, geometry)) / shapely.area(
+                boxes
+            )
+        else:
+            weight = shapely.contains_xy(
+                geometry, lon[lon_grid], lat[lat_grid]
+            ).astype(float)
+
+        weight = weight * lat_scale[lat_grid]
+        keep = weight > 0
+        rows.append(np.full(keep.sum(), row))
+        cols.append(lat_grid[keep] * len(lon) + lon_grid[keep])
+        data.append(weight[keep])
+
+    if len(data) == 0:
+        return sparse.csr_matrix((len(geometries), len(lat) * len(lon)))
+
+    return sparse.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(geometries), len(lat) * len(lon)),
+    )
+
+
+def get_region_weight_path(key: str) -> str:
+    if Path(intermediate_data_dir).exists() == False:
+        Path(intermediate_data_dir).mkdir()
+    return f"{intermediate_data_dir}/region_weight_{key}.npz"
+
+
+def get_region_weight(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    names: list,
+    geometries: list,
+    fractional: bool = True,
+    area_weight: bool = False,
+) -> sparse.csr_matrix:
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    memory_key = (lat.tobytes(), lon.tobytes(), tuple(names), fractional, area_weight)
+    if memory_key in region_weight_cache:
+        return region_weight_cache[memory_key]
+
+    digest = hashlib.sha1()
+    digest.update(lat.tobytes())
+    digest.update(lon.tobytes())
+    digest.update(f"{fractional}_{area_weight}".encode())
+    for name, geometry in zip(names, geometries):
+        digest.update(name.encode())
+        digest.update(shapely.to_wkb(geometry))
+    path = get_region_weight_path(digest.hexdigest()[:16])
+
+    if Path(path).exists():
+        cached = np.load(path)
+        weight = sparse.csr_matrix(
+            (cached["data"], cached["indices"], cached["indptr"]),
+            shape=tuple(cached["shape"]),
+        )
+    else:
+        info(f"Generating {path}")
+        weight = build_region_weight(lat, lon, geometries, fractional, area_weight)
+        np.savez(
+            path,
+            data=weight.data,
+            indices=weight.indices,
+            indptr=weight.indptr,
+            shape=np.array(weight.shape),
+        )
+
+    region_weight_cache[memory_key] = weight
+    return weight
+
+
+def flatten_grid(values: np.ndarray) -> np.ndarray:
+    # (..., lat, lon) -> (other, lat * lon)
+    return values.reshape(-1, values.shape[-2] * values.shape[-1])
+
+
+def region_mean(values: np.ndarray, weight: sparse.csr_matrix) -> np.ndarray:
+    # 各区域忽略 NaN 的加权平均，形状 (region, other)
+    flat = flatten_grid(values)
+    valid = ~np.isnan(flat)
+    total = weight @ np.where(valid, flat, 0).T
+    count = weight @ valid.T.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def region_max(values: np.ndarray, weight: sparse.csr_matrix) -> np.ndarray:
+    # 各区域覆盖格网的最大值，形状 (region, other)
+    flat = flatten_grid(values)
+    result = np.full((weight.shape[0], flat.shape[0]), np.nan)
+    row_size = np.diff(weight.indptr)
+    rows = np.nonzero(row_size > 0)[0]
+    if len(rows) == 0:
+        return result
+
+    gathered = np.where(np.isnan(flat), -np.inf, flat)[:, weight.indices]
+    reduced = np.maximum.reduceat(gathered, weight.indptr[rows], axis=1).T
+    result[rows] = np.where(np.isneginf(reduced), np.nan, reduced)
+    return result
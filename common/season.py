@@ -0,0 +1,25 @@
+import calendar
+from datetime import datetime
+
+import xarray as xr
+from xclim.core.missing import missing_any
+
+from config import period_start, period_end
+from utils import is_cross_year_period
+
+
+def get_season_freq() -> str:
+    # 每个周期恰好是一个完整季节的重采样频率，跨年季节以起始月为年首
+    if not is_cross_year_period():
+        return "YS"
+    month = datetime.strptime(period_start, "%m-%d").month
+    return f"YS-{calendar.month_abbr[month].upper()}"
+
+
+def mask_missing(result: xr.DataArray, da: xr.DataArray) -> xr.DataArray:
+    # 同 xclim 指标默认的 missing="any"：季节内有缺测或不完整的格网为空值
+    indexer = {}
+    if is_cross_year_period():
+        indexer["date_bounds"] = (period_start, period_end)
+    missing = missing_any(da, get_season_freq(), src_timestep="D", **indexer)
+    return result.where(~missing)
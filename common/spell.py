@@ -0,0 +1,58 @@
+import numba
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+@numba.njit(parallel=True, cache=True)
+def spell_kernel(condition: np.ndarray, window: int) -> tuple:
+    # condition 为 (格网, 时间)，每个格网一次遍历得到三个统计量
+    cells, steps = condition.shape
+    longest = np.zeros(cells, dtype=np.int64)
+    count = np.zeros(cells, dtype=np.int64)
+    days = np.zeros(cells, dtype=np.int64)
+    for j in numba.prange(cells):
+        run = 0
+        for i in range(steps + 1):
+            if i < steps and condition[j, i]:
+                run += 1
+                continue
+            if run > longest[j]:
+                longest[j] = run
+            if run >= window:
+                count[j] += 1
+                days[j] += run
+            run = 0
+    return longest, count, days
+
+
+def get_spells(condition: np.ndarray, window: int = 1) -> tuple:
+    # 布尔数组沿首维的连续段：最长段、不短于 window 的段数及其天数
+    shape = condition.shape[1:]
+    condition = np.ascontiguousarray(condition.reshape(condition.shape[0], -1).T)
+    return tuple(
+        result.reshape(shape) for result in spell_kernel(condition, window)
+    )
+
+
+def get_spell_stats(
+    condition: xr.DataArray, window: int = 1, freq: str = "YS"
+) -> xr.Dataset:
+    # 按 freq 分段统计，连续段在周期边界截断，同 xclim 的 resample_before_rl
+    condition = condition.transpose("time", ...)
+    dims = condition.dims
+    labels = []
+    results = {"longest": [], "count": [], "days": []}
+    for label, group in condition.resample(time=freq):
+        longest, count, days = get_spells(np.asarray(group.values, dtype=bool), window)
+        labels.append(label)
+        results["longest"].append(longest)
+        results["count"].append(count)
+        results["days"].append(days)
+
+    coords = {name: condition[name] for name in dims[1:] if name in condition.coords}
+    coords["time"] = pd.DatetimeIndex(labels)
+    return xr.Dataset(
+        {name: (dims, np.stack(values)) for name, values in results.items()},
+        coords=coords,
+    )
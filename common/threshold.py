@@ -0,0 +1,95 @@
+import functools
+import hashlib
+import json
+from pathlib import Path
+
+import xarray as xr
+import xclim
+from xclim.core.calendar import percentile_doy
+
+from config import (
+    intermediate_data_dir,
+    base_start_year,
+    base_end_year,
+    base_mode,
+    period_start,
+    period_end,
+    use_cache,
+)
+from logutil import info
+from utils import (
+    merge_base_years_period,
+    load_daily_data_single,
+    get_daily_store_years,
+    get_daily_store_stats,
+    open_daily_store,
+    save_to_zarr,
+)
+
+threshold_cache = {}
+
+
+@functools.lru_cache(maxsize=None)
+def get_base_fingerprint(variable: str, local_mode: str = base_mode) -> str:
+    # 基准期输入的指纹：各年份在日数据 zarr 中的位置、校验统计和格网坐标
+    # 需要读取全部基准期年份，每个进程只计算一次
+    for year in range(base_start_year, base_end_year + 1):
+        load_daily_data_single(variable, str(year), local_mode=local_mode)
+
+    years = get_daily_store_years(variable, local_mode)
+    validation = get_daily_store_stats(variable, local_mode)
+    store = open_daily_store(variable, local_mode)
+    digest = hashlib.sha1()
+    for year in range(base_start_year, base_end_year + 1):
+        digest.update(f"{year}:{years[str(year)]}".encode())
+        digest.update(json.dumps(validation[str(year)], sort_keys=True).encode())
+    digest.update(store["lat"].values.tobytes())
+    digest.update(store["lon"].values.tobytes())
+    return digest.hexdigest()
+
+
+def get_threshold_path(variable: str, per: int, window: int, key: str) -> str:
+    path = Path(intermediate_data_dir).joinpath("threshold")
+    path.mkdir(parents=True, exist_ok=True)
+    return f"{path}/{variable}_p{per}_w{window}_{key}.zarr"
+
+
+def get_doy_threshold(
+    variable: str,
+    per: int,
+    window: int = 5,
+) -> xr.DataArray:
+    # 基准期逐日百分位阈值，按参数和基准期输入指纹保存到 zarr，各情景复用
+
+    # 本进程已读取过的阈值直接返回，不再计算基准期指纹
+    cache_key = (variable, per, window)
+    if cache_key in threshold_cache:
+        return threshold_cache[cache_key]
+
+    params = {
+        "variable": variable,
+        "per": per,
+        "window": window,
+        "base_start_year": base_start_year,
+        "base_end_year": base_end_year,
+        "period_start": period_start,
+        "period_end": period_end,
+        "xclim": xclim.__version__,
+        "input": get_base_fingerprint(variable, base_mode),
+    }
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+    path = get_threshold_path(variable, per, window, key)
+    if use_cache and Path(path).exists():
+        info(f"Using cached threshold {path}")
+    else:
+        info(f"Generating threshold {path}")
+        base_ds = merge_base_years_period(variable)
+        threshold = percentile_doy(base_ds[variable], window=window, per=per)
+        # 与输入数据同精度保存，内存中计算得到的是 float64
+        threshold = threshold.sel(percentiles=per).astype(base_ds[variable].dtype)
+        save_to_zarr(threshold.to_dataset(name=variable), path)
+
+    threshold = xr.open_zarr(path)[variable].load()
+    threshold_cache[cache_key] = threshold
+    return threshold
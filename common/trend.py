@@ -0,0 +1,197 @@
+import sys
+import hashlib
+from pathlib import Path
+
+import numba
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy.stats import norm
+
+from config import mode, trend_chunk_cells
+from common.cube import frame_to_cube
+from common.fingerprint import (
+    FingerprintStore,
+    get_code_fingerprint,
+    hash_value,
+)
+from logutil import info, profiled
+from utils import get_grid_trend_path, save_to_zarr
+
+trend_stats = ["slope", "s", "var_s", "z", "p"]
+
+
+@numba.njit(parallel=True, cache=True)
+def trend_kernel(values: np.ndarray) -> tuple:
+    # values 为 (序列, 时间)，缺测为 NaN，每条序列独立计算
+    series, steps = values.shape
+    slope = np.full(series, np.nan)
+    s = np.zeros(series)
+    var_s = np.full(series, np.nan)
+    for k in numba.prange(series):
+        x = values[k]
+
+        # Sen 斜率按原始位置计算两两斜率，跳过缺测
+        pairs = np.empty(steps * (steps - 1) // 2)
+        m = 0
+        for i in range(steps - 1):
+            if np.isnan(x[i]):
+                continue
+            for j in range(i + 1, steps):
+                if not np.isnan(x[j]):
+                    pairs[m] = (x[j] - x[i]) / (j - i)
+                    m += 1
+        if m > 0:
+            slope[k] = np.median(pairs[:m])
+
+        # MK 检验在去掉缺测后的序列上计算
+        valid = x[~np.isnan(x)]
+        n = len(valid)
+        if n == 0:
+            continue
+        score = 0.0
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                if valid[j] > valid[i]:
+                    score += 1
+                elif valid[j] < valid[i]:
+                    score -= 1
+        s[k] = score
+
+        # 结值修正
+        ordered = np.sort(valid)
+        ties = 0.0
+        run = 1
+        for i in range(1, n + 1):
+            if i < n and ordered[i] == ordered[i - 1]:
+                run += 1
+                continue
+            ties += run * (run - 1) * (2 * run + 5)
+            run = 1
+        variance = (n * (n - 1) * (2 * n + 5) - ties) / 18
+
+        # Yue-Wang：去趋势序列全部滞后的自相关修正方差
+        detrend = valid - np.arange(1, n + 1) * slope[k]
+        detrend = detrend - detrend.mean()
+        acov0 = np.sum(detrend * detrend) / n
+        sni = 0.0
+        for lag in range(1, n):
+            acov = 0.0
+            for i in range(n - lag):
+                acov += detrend[i] * detrend[i + lag]
+            sni += (1 - lag / n) * (acov / n / acov0)
+        var_s[k] = variance * (1 + 2 * sni)
+    return slope, s, var_s
+
+
+def yue_wang_mk(values: np.ndarray) -> dict:
+    # 每行的 Yue-Wang 修正 MK 检验，缺测为 NaN，结果同 pymannkendall
+    values = np.ascontiguousarray(values, dtype=float)
+    slope, s, var_s = trend_kernel(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(s > 0, (s - 1) / np.sqrt(var_s), 0.0)
+        z = np.where(s < 0, (s + 1) / np.sqrt(var_s), z)
+    p = 2 * (1 - norm.cdf(np.abs(z)))
+    # 没有有效值的序列不给出检验结果
+    p[np.isnan(values).all(axis=1)] = np.nan
+    return {"slope": slope, "s": s, "var_s": var_s, "z": z, "p": p}
+
+
+def get_series_matrix(
+    df: pd.DataFrame, group_by: list, columns: list
+) -> tuple[pd.DataFrame, np.ndarray]:
+    # 每组按原有行顺序排成一行，较短的组末尾补 NaN
+    df = df.sort_values(group_by, kind="stable")
+    grouped = df.groupby(group_by, sort=False)
+    codes = grouped.ngroup().to_numpy()
+    position = grouped.cumcount().to_numpy()
+    keys = df[group_by].drop_duplicates()
+    matrix = np.full((len(keys), len(columns), position.max() + 1), np.nan)
+    matrix[codes, :, position] = df[columns].to_numpy(dtype=float)
+    return keys, matrix
+
+
+def calculate_trend(
+    df: pd.DataFrame, group_by="name", columns: list = None
+) -> pd.DataFrame:
+    # 每个 group_by 序列每列的趋势，group_by 为 name（县）或 [lat, lon]（格网）
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    if columns is None:
+        columns = [c for c in df.columns if c not in group_by + ["year"]]
+    keys, matrix = get_series_matrix(df, group_by, columns)
+    result = yue_wang_mk(matrix.reshape(-1, matrix.shape[-1]))
+
+    index = keys.loc[keys.index.repeat(len(columns))].reset_index(drop=True)
+    index["indictor"] = np.tile(columns, len(keys))
+    return pd.DataFrame(result).set_index(pd.MultiIndex.from_frame(index))
+
+
+def hash_dataframe(df: pd.DataFrame) -> str:
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values)
+    return hash_value([list(df.columns), digest.hexdigest()])
+
+
+def load_trend(
+    df: pd.DataFrame, target: str, group_by="name", columns: list = None
+) -> pd.DataFrame:
+    # 数据、参数和代码不变时复用 target 中的结果
+    fingerprints = FingerprintStore(f"{Path(target).parent}/fingerprints.json")
+    key = hash_value(
+        {
+            "data": hash_dataframe(df),
+            "group_by": group_by,
+            "columns": columns,
+            "code": get_code_fingerprint(sys.modules[__name__]),
+        }
+    )
+    if fingerprints.is_current(target, key):
+        result = pd.read_csv(target)
+        return result.set_index([c for c in result.columns if c not in trend_stats])
+
+    result = calculate_trend(df, group_by, columns)
+    result.to_csv(target)
+    fingerprints.record(target, key)
+    return result
+
+
+def calculate_grid_trend(
+    cube: xr.DataArray, chunk_cells: int = trend_chunk_cells
+) -> xr.Dataset:
+    # 合并后数组各格网的趋势，按 chunk_cells 分块并行，slope 为每年的值
+    if isinstance(cube, pd.DataFrame):
+        cube = frame_to_cube(cube)
+    columns = cube["indictor"].values.tolist()
+    cells = cube.sizes["lat"] * cube.sizes["lon"]
+
+    result = {stat: np.full((len(columns), cells), np.nan) for stat in trend_stats}
+    for k, column in enumerate(columns):
+        series = cube.sel(indictor=column).transpose("lat", "lon", "year")
+        values = series.values.reshape(cells, cube.sizes["year"])
+        for start in range(0, cells, chunk_cells):
+            chunk = yue_wang_mk(values[start : start + chunk_cells])
+            for stat in trend_stats:
+                result[stat][k, start : start + chunk_cells] = chunk[stat]
+
+    shape = (len(columns), cube.sizes["lat"], cube.sizes["lon"])
+    data_vars = {
+        stat: (("lat", "lon", "indictor"), value.reshape(shape).transpose(1, 2, 0))
+        for stat, value in result.items()
+    }
+    trend = xr.Dataset(
+        data_vars,
+        coords={"lat": cube["lat"], "lon": cube["lon"], "indictor": columns},
+    )
+    trend["significant"] = trend["p"] < 0.05
+    return trend
+
+
+@profiled
+def process_grid_trend(cube: xr.DataArray, local_mode: str = mode) -> xr.Dataset:
+    trend = calculate_grid_trend(cube)
+    save_to_zarr(trend, get_grid_trend_path(local_mode))
+    info(f"grid trend of {trend.indictor.values.tolist()} saved for {local_mode}")
+    return trend
+
+
+def load_grid_trend(local_mode: str = mode) -> xr.Dataset:
+    return xr.open_zarr(get_grid_trend_path(local_mode)).load()
@@ -171,10 +171,20 @@ deltachange_methods = {
     "pr": "qdm",
 }
 
+# 多模式集合平均时同时输出 min/max/std
+cmip6_ensemble_spread = False
+
 cmip6_data_dir = "Z:/fangjiamin/bias_correction/result_data"
 era5_data_dir = "era5_data"
 result_data_dir = "result_data"
 intermediate_data_dir = "intermediate_data"
+# 逐年中间结果的存储格式："parquet" 或 "csv"
+intermediate_format = "parquet"
+# 每个变量、情景一个日数据 zarr，time 维分块长度（天）
+daily_store_time_chunk = 92
+# 各阶段的耗时、CPU、内存峰值和读写量以 JSON 行记录，每个进程写入
+# profile.<pid>.jsonl，None 为不记录
+profile_file = f"{result_data_dir}/profile.jsonl"
 
 period_start = "10-01"
 period_end = "06-30"
@@ -189,8 +199,27 @@ cds_api_key = os.environ.get("CDS_API_KEY")
 
 use_cache = True
 
+# 按输入变量分组，同一组指标共享每个季节的数据读取
+fused_calculate = True
+# 按年份并行计算的进程数，1 为串行
+year_workers = 1
+# 多个情景同时计算的进程数，1 为逐个情景计算
+mode_workers = 1
+# dask 调度方式："threads"、"processes"、"synchronous" 或 "distributed"
+# （本地集群，需另行安装 distributed 包）
+dask_scheduler = "threads"
+# dask 并发数，None 为 CPU 核数
+dask_workers = None
+# 内存上限：不大于 1 时为物理内存比例，否则为字节数，None 为当前可用内存
+dask_memory_limit = 0.8
+
 download_era5 = False
 use_download_cache = use_cache
+# ERA5 日统计所用时区（相对 UTC 的小时数），逐小时数据按此时区划分自然日
+era5_time_zone_offset = 8
+# 同时在 CDS 排队的请求数和同时下载的文件数
+era5_request_workers = 8
+era5_download_workers = 2
 
 
 target_crs = ccrs.AlbersEqualArea(
@@ -204,5 +233,19 @@ pr_colormap = plt.get_cmap("Blues")
 
 max_outlier = 5
 
+# 合并后的格网结果另存 all.csv 和 all_mean.csv（交付用），计算和绘图读取 all.npy
+export_merged_csv = False
+
+# 格网趋势检验每块的格网数，块内按 CPU 核并行
+trend_chunk_cells = 4096
+
+# 县域统计权重：按格网被县域覆盖的面积比例加权，可选 cos(lat) 面积加权
+region_weight_fractional = True
+region_weight_area = False
+# 日数据入库时裁剪到县域外接矩形（外扩 crop_margin 度），crop_mask 时县域外格网置空
+crop_to_regions = True
+crop_margin = 0.5
+crop_mask = False
+
 mode = "ssp245"
 base_mode = "era5"
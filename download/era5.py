@@ -1,17 +1,17 @@
-import cdsapi
-import os
-import pickle
-from pathlib import Path
 from typing import Union
 
 from config import (
     download_era5,
-    era5_data_dir,
     use_download_cache,
     cds_api_key,
     start_year,
     end_year,
+    era5_time_zone_offset,
+    era5_request_workers,
+    era5_download_workers,
 )
+from download.manager import CdsClient, DownloadManager, DownloadManifest
+from logutil import error
 from utils import get_era5_data_path
 
 dataset = "derived-era5-single-levels-daily-statistics"
@@ -65,11 +65,15 @@ train_years = [str(year) for year in range(start_year, end_year + 1)]
 train_months = [f"{month:02d}" for month in range(1, 13)]
 train_days = [f"{day:02d}" for day in range(1, 32)]
 
+manifest_file = "era5_download_manifest.json"
+
 if download_era5:
-    client = cdsapi.Client(
-        wait_until_complete=False,
-        key=cds_api_key,
-        url="https://cds.climate.copernicus.eu/api",
+    client = CdsClient(url="https://cds.climate.copernicus.eu/api", key=cds_api_key)
+    manager = DownloadManager(
+        client,
+        DownloadManifest(manifest_file),
+        request_workers=era5_request_workers,
+        download_workers=era5_download_workers,
     )
 
 
@@ -77,53 +81,26 @@ def get_era5_data(var_list: Union[list[str], str]):
     if isinstance(var_list, str):
         var_list = [var_list]
 
+    if not download_era5:
+        return
+
+    jobs = []
     for var in var_list:
-        get_era5_data_single(var)
+        for year in train_years:
+            jobs.append(
+                (get_era5_data_path(var, year), dataset, get_era5_request(var, year))
+            )
+
+    failed = manager.run(jobs, use_cache=use_download_cache)
+    if len(failed) != 0:
+        error(f"{len(failed)} downloads failed: {failed}")
 
 
 def get_era5_data_single(variable: str):
-    if not download_era5:
-        return
+    get_era5_data([variable])
+
 
-    status_file = "era5_download_status.pkl"
-    if os.path.exists(status_file):
-        with open(status_file, "rb") as f:
-            result_buf = pickle.load(f)
-    else:
-        result_buf = {}
-
-    for year in train_years:
-        target = f"{era5_data_dir}/{variable}_era5_origin_{year}.nc"
-        if use_download_cache and os.path.exists(target):
-            print(f"{target} exists, skipping")
-            continue
-
-        if use_download_cache and target in result_buf:
-            print(f"{target} already in buffer, skipping")
-            continue
-
-        result_buf[target] = retrieve_era5_data(variable, year)
-
-        # 将 result_buf 暂存到文件
-        with open(status_file, "wb") as f:
-            pickle.dump(result_buf, f)
-
-    for target, result in result_buf.items():
-        if use_download_cache and os.path.exists(target):
-            print(f"{target} exists, skipping")
-            continue
-        if use_download_cache and not Path(target).name.startswith(f"{variable}_"):
-            print(f"{target} does not start with {variable}, skipping")
-            continue
-        try:
-            result.download(target)
-            print(f"{target} download success")
-        except Exception as e:
-            print(e)
-
-
-def retrieve_era5_data(key: str, year: str):
-    print(f"Downloading {key} data for {year}")
+def get_era5_request(key: str, year: str) -> dict:
     # if key == "pr":
     #     request = {
     #     "product_type": ["reanalysis"],
@@ -143,8 +120,8 @@ def retrieve_era5_data(key: str, year: str):
         "day": train_days,
         "area": area,
         "daily_statistic": statistic_dict[key],
-        "time_zone": "utc+08:00",
+        "time_zone": f"utc{era5_time_zone_offset:+03d}:00",
         "frequency": "1_hourly",
     }
 
-    return client.retrieve(dataset, request)
+    return request
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from common.fingerprint import write_json_atomic
+from logutil import info, error, warn
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_validator(response: requests.Response) -> str:
+    # 用于 If-Range 的资源标识，优先使用 ETag
+    return response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+
+class DownloadManifest:
+    """Request and download state of every target, kept in a JSON file.
+
+    Every update is written atomically, so an interrupted run never leaves
+    it truncated.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if Path(path).exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, target: str) -> dict:
+        with self.lock:
+            return dict(self.entries.get(target, {}))
+
+    def update(self, target: str, **fields):
+        with self.lock:
+            self.entries.setdefault(target, {}).update(fields)
+            write_json_atomic(self.path, self.entries)
+
+
+class CdsClient:
+    """Minimal client of the CDS retrieve API (``/retrieve/v1``)."""
+
+    def __init__(self, url: str, key: str, timeout: int = 60):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if key:
+            self.session.headers["PRIVATE-TOKEN"] = key
+
+    def submit(self, dataset: str, request: dict) -> str:
+        response = self.session.post(
+            f"{self.url}/retrieve/v1/processes/{dataset}/execution",
+            json={"inputs": request},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["jobID"]
+
+    def status(self, job_id: str) -> str:
+        # accepted / running / successful / failed / rejected / dismissed
+        response = self.session.get(
+            f"{self.url}/retrieve/v1/jobs/{job_id}", timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["status"]
+
+    def result(self, job_id: str) -> dict:
+        response = self.session.get(
+            f"{self.url}/retrieve/v1/jobs/{job_id}/results", timeout=self.timeout
+        )
+        response.raise_for_status()
+        asset = response.json()["asset"]["value"]
+        return {"href": asset["href"], "size": asset.get("file:size")}
+
+    def open(
+        self, href: str, offset: int = 0, validator: str = None
+    ) -> requests.Response:
+        headers = {}
+        if offset > 0:
+            # 资源已变化时服务端忽略 Range 返回完整文件
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        response = self.session.get(
+            href, headers=headers, stream=True, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response
+
+
+class DownloadManager:
+    """Submit, poll and download many requests with bounded concurrency.
+
+    ``client`` provides ``submit``/``status``/``result``/``open`` like
+    ``CdsClient``. At most ``request_workers`` requests are in flight and at
+    most ``download_workers`` files are transferred at the same time. A file
+    is downloaded to ``{target}.part`` and resumed with an If-Range request
+    only while the server reports the same ETag/Last-Modified, checked
+    against the size reported by the server and recorded in the manifest
+    with its sha256; recorded files are not fetched again.
+    """
+
+    running_states = ["accepted", "running"]
+
+    def __init__(
+        self,
+        client,
+        manifest: DownloadManifest,
+        request_workers: int = 8,
+        download_workers: int = 2,
+        poll_interval: float = 30,
+    ):
+        self.client = client
+        self.manifest = manifest
+        self.request_workers = request_workers
+        self.download_slots = threading.Semaphore(download_workers)
+        self.poll_interval = poll_interval
+
+    def is_complete(self, target: str, request: dict = None) -> bool:
+        entry = self.manifest.get(target)
+        if entry.get("state") != "done" or not Path(target).exists():
+            return False
+        # 请求参数变化后旧文件作废
+        if request is not None and entry.get("request", request) != request:
+            return False
+        stat = Path(target).stat()
+        if stat.st_size != entry.get("size"):
+            return False
+        # 文件未被改动时直接信任记录的校验和
+        if stat.st_mtime == entry.get("mtime"):
+            return True
+        return file_sha256(target) == entry.get("sha256")
+
+    def record_complete(self, target: str):
+        stat = Path(target).stat()
+        self.manifest.update(
+            target,
+            state="done",
+            size=stat.st_size,
+            sha256=file_sha256(target),
+            mtime=stat.st_mtime,
+        )
+
+    def run(self, jobs: list, use_cache: bool = True) -> list:
+        """Fetch ``jobs`` of ``(target, dataset, request)``, return the failed targets."""
+        pending = []
+        for target, dataset, request in jobs:
+            if use_cache and self.is_complete(target, request):
+                info(f"{target} exists, skipping")
+                continue
+            if use_cache and Path(target).exists() and not self.manifest.get(target):
+                # 清单建立之前下载的文件
+                info(f"{target} exists, recording in manifest")
+                self.manifest.update(target, dataset=dataset, request=request)
+                self.record_complete(target)
+                continue
+            pending.append((target, dataset, request))
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.request_workers) as pool:
+            futures = [
+                (job[0], pool.submit(self.fetch, *job, use_cache)) for job in pending
+            ]
+            for target, future in futures:
+                try:
+                    future.result()
+                    info(f"{target} download success")
+                except Exception as e:
+                    error(f"{target} download failed: {e}")
+                    self.manifest.update(target, state="failed", error=repr(e))
+                    failed.append(target)
+        return failed
+
+    def fetch(self, target: str, dataset: str, request: dict, use_cache: bool = True):
+        entry = self.manifest.get(target)
+        job_id = entry.get("job_id")
+        if (
+            not use_cache
+            or job_id is None
+            or entry.get("request") != request
+            or entry.get("state") == "failed"
+        ):
+            job_id = self.submit(target, dataset, request)
+
+        try:
+            status = self.wait(job_id)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            # 服务端已清理过期的请求，重新提交
+            warn(f"{target} request {job_id} expired, resubmitting")
+            job_id = self.submit(target, dataset, request)
+            status = self.wait(job_id)
+        if status != "successful":
+            raise RuntimeError(f"request {job_id} {status}")
+
+        result = self.client.result(job_id)
+        self.manifest.update(target, state="downloading", size=result["size"])
+        with self.download_slots:
+            self.download(target, result["href"], result["size"])
+        self.record_complete(target)
+
+    def submit(self, target: str, dataset: str, request: dict) -> str:
+        info(f"Submitting {target}")
+        # 新请求的结果与之前的部分下载不是同一个文件
+        Path(f"{target}.part").unlink(missing_ok=True)
+        job_id = self.client.submit(dataset, request)
+        self.manifest.update(
+            target, state="submitted", job_id=job_id, dataset=dataset, request=request
+        )
+        return job_id
+
+    def wait(self, job_id: str) -> str:
+        status = self.client.status(job_id)
+        while status in self.running_states:
+            time.sleep(self.poll_interval)
+            status = self.client.status(job_id)
+        return status
+
+    def download(self, target: str, href: str, size: int = None):
+        part_path = f"{target}.part"
+        Path(target).parent.mkdir(parents=True, exist_ok=True)
+        offset = Path(part_path).stat().st_size if Path(part_path).exists() else 0
+        # 只有确认是同一个结果文件时才续传
+        entry = self.manifest.get(target)
+        validator = entry.get("validator") if entry.get("href") == href else None
+        if validator is None or (size is not None and offset > size):
+            offset = 0
+
+        if size is None or offset < size:
+            with self.client.open(href, offset, validator) as response:
+                # 服务端不支持 Range 或资源已变化时从头下载
+                if offset > 0 and response.status_code != 206:
+                    offset = 0
+                self.manifest.update(
+                    target, href=href, validator=get_validator(response)
+                )
+                with open(part_path, "ab" if offset > 0 else "wb") as f:
+                    for block in response.iter_content(chunk_size=1 << 20):
+                        f.write(block)
+
+        actual = Path(part_path).stat().st_size
+        if size is not None and actual != size:
+            raise IOError(f"{target} has {actual} bytes, expected {size}")
+        os.replace(part_path, target)
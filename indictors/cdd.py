@@ -2,29 +2,33 @@ import xarray as xr
 from matplotlib import pyplot as plt
 import pandas as pd
 import xclim
-from xclim.indicators.atmos import maximum_consecutive_dry_days
+from xclim.core.units import convert_units_to
 from utils import (
     get_origin_result_data_path,
     range_data_period,
     mean_by_region,
-    reindex_ds_to_all_year,
     merge_intermediate_post_process,
     merge_intermediate,
 )
-from config import pr_colormap
+from common.season import get_season_freq, mask_missing
+from common.spell import get_spell_stats
+from config import pr_colormap, mode
 from plot import draw_latlon_map, add_title
 
 xclim.set_options(data_validation="log")
 indicator_name = "cdd"
 unit = "d"
-default_value = 10
 show_name = "CDD"
+input_variables = ["pr"]
+region_reduce = mean_by_region
 
 
 # 日降水量 < 1 mm 持续天数最大值
 def process_cdd(ds: xr.Dataset):
-    ds = reindex_ds_to_all_year(ds, default_value)
-    result = maximum_consecutive_dry_days(ds["pr"], thresh="1 mm/day", freq="YS")
+    # 同 xclim maximum_consecutive_dry_days，季节内有缺测时为空值
+    thresh = convert_units_to("1 mm/day", ds["pr"], context="hydro")
+    result = get_spell_stats(ds["pr"] < thresh, freq=get_season_freq())["longest"]
+    result = mask_missing(result.astype(float), ds["pr"])
     result.name = indicator_name
     return result
 
@@ -34,14 +38,14 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("pr", process_cdd, mean_by_region)
+        range_data_period(input_variables, process_cdd, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -1,42 +1,44 @@
 import xarray as xr
 from matplotlib import pyplot as plt
-from xclim.core.calendar import percentile_doy
 import pandas as pd
-from xclim.indices import cold_spell_duration_index
+from xclim.core.calendar import resample_doy
+from xclim.core.units import convert_units_to
 from pathlib import Path
 from datetime import datetime
 from utils import (
-    merge_base_years_period,
     get_origin_result_data_path,
     merge_intermediate,
     range_data_period,
     mean_by_region,
-    reindex_ds_to_all_year,
     merge_intermediate_post_process,
 )
+from common.season import get_season_freq
+from common.spell import get_spell_stats
+from common.threshold import get_doy_threshold
 from plot import draw_latlon_map, add_title
-from config import tas_colormap
+from config import tas_colormap, mode
 
 indicator_name = "csdi"
 unit = "d"
-default_value = 999
 show_name = "CSDI"
+input_variables = ["tasmin"]
+region_reduce = mean_by_region
+# 子进程并行计算时需要从主进程广播的全局变量
+shared_state = ["p10"]
 
-base_ds = None
 p10 = None
 
 def before_process():
-    global base_ds, p10
-    base_ds = merge_base_years_period(
-        "tasmin", reindex=True, full_year=False, default_value=default_value
-    )
-    p10 = percentile_doy(base_ds["tasmin"], per=10).sel(percentiles=10)
+    global p10
+    p10 = get_doy_threshold("tasmin", per=10, window=5)
 
 
 # 日最低气温小于第10百分位数时，至少连续6天的年天数
 def process_csdi(ds: xr.Dataset):
-    ds = reindex_ds_to_all_year(ds, default_value, full_year=False)
-    result = cold_spell_duration_index(ds["tasmin"], p10, freq="YS")
+    # 同 xclim cold_spell_duration_index：低于阈值且连续至少 6 天的天数
+    thresh = resample_doy(convert_units_to(p10, ds["tasmin"]), ds["tasmin"])
+    result = get_spell_stats(ds["tasmin"] < thresh, window=6, freq=get_season_freq())
+    result = result["days"]
     result.name = indicator_name
     return result
 
@@ -46,15 +48,15 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
         before_process()
-        range_data_period("tasmin", process_csdi, mean_by_region)
+        range_data_period(input_variables, process_csdi, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -2,28 +2,32 @@ import xarray as xr
 from matplotlib import pyplot as plt
 import pandas as pd
 import numpy as np
-from xclim.indices import maximum_consecutive_wet_days
+from xclim.core.units import convert_units_to
 from utils import (
     get_origin_result_data_path,
     range_data_period,
     mean_by_region,
-    reindex_ds_to_all_year,
     merge_intermediate_post_process,
     merge_intermediate,
 )
 
 from plot import draw_latlon_map, add_title
-from config import pr_colormap
+from common.season import get_season_freq
+from common.spell import get_spell_stats
+from config import pr_colormap, mode
 
-default_value = 0
 indicator_name = "cwd"
 unit = "d"
 show_name = "CWD"
+input_variables = ["pr"]
+region_reduce = mean_by_region
 
 
 def process_cwd(ds: xr.Dataset):
-    ds = reindex_ds_to_all_year(ds, default_value)
-    result = maximum_consecutive_wet_days(ds["pr"], thresh="1 mm/day")
+    # 同 xclim maximum_consecutive_wet_days
+    thresh = convert_units_to("1 mm/day", ds["pr"], context="hydro")
+    result = get_spell_stats(ds["pr"] > thresh, freq=get_season_freq())["longest"]
+    result = result.astype(float)
     result.name = indicator_name
     return result
 
@@ -33,14 +37,14 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("pr", process_cwd, mean_by_region)
+        range_data_period(input_variables, process_cwd, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -10,12 +10,14 @@ from utils import (
     merge_intermediate,
 )
 from plot import draw_latlon_map, add_title
-from config import tas_colormap
+from config import tas_colormap, mode
 
 # FD, Number of frost days: Annual count of days when TN (daily minimum temperature) < 0oC.
 indicator_name = "fd"
 unit = "d"
 show_name = "FD"
+input_variables = ["tasmin"]
+region_reduce = mean_by_region
 
 
 def process_fd(ds: xr.Dataset) -> xr.DataArray:
@@ -29,14 +31,14 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("tasmin", process_fd, mean_by_region)
+        range_data_period(input_variables, process_fd, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -33,6 +33,17 @@ def process_hur_cmip6(ds: xr.Dataset) -> xr.DataArray:
     return hur
 
 
+def get_mode_inputs(local_mode: str) -> tuple[list[str], callable]:
+    # ERA5 由露点温度和气温计算，CMIP6 直接使用 hurs
+    if local_mode == "era5":
+        return ["tdps", "tas"], process_hur_era5
+    return ["hurs"], process_hur_cmip6
+
+
+input_variables, process_hur = get_mode_inputs(mode)
+region_reduce = mean_by_region
+
+
 def draw(df: pd.DataFrame, ax=None, show_colorbar=True):
     draw_latlon_map(
         df,
@@ -45,18 +56,16 @@ def draw(df: pd.DataFrame, ax=None, show_colorbar=True):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
 
     if process:
-        if mode == "era5":
-            range_data_period(["tdps", "tas"], process_hur_era5, mean_by_region)
-        else:
-            range_data_period(["hurs"], process_hur_cmip6, mean_by_region)
+        variables, process_mode = get_mode_inputs(local_mode)
+        range_data_period(variables, process_mode, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -8,12 +8,14 @@ from utils import (
     merge_intermediate,
 )
 from plot import draw_latlon_map, add_title
-from config import pr_colormap
+from config import pr_colormap, mode
 
 # PR, Precipitation: Annual total precipitation.
 indicator_name = "pr"
 unit = "mm \cdot d^{-1}"
 show_name = "Pr"
+input_variables = ["pr"]
+region_reduce = mean_by_region
 
 
 def process_pr(ds: xr.Dataset) -> xr.DataArray:
@@ -34,14 +36,14 @@ def draw(df: pd.DataFrame, ax=None, show_colorbar=True):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("pr", process_pr, mean_by_region)
+        range_data_period(input_variables, process_pr, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
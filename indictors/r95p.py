@@ -1,30 +1,31 @@
 import xarray as xr
-from xclim.core.calendar import percentile_doy
 import pandas as pd
 
 from xclim.indices import days_over_precip_thresh
 
 from utils import (
     get_origin_result_data_path,
-    merge_base_years_period,
     range_data_period,
     mean_by_region,
     merge_intermediate_post_process,
     merge_intermediate,
 )
+from common.threshold import get_doy_threshold
 from plot import draw_latlon_map, add_title
-from config import pr_colormap
+from config import pr_colormap, mode
 
-base_ds = None
 r95 = None
 indicator_name = "r95p"
 unit = "d"
 show_name = "R95p"
+input_variables = ["pr"]
+region_reduce = mean_by_region
+# 子进程并行计算时需要从主进程广播的全局变量
+shared_state = ["r95"]
 
 def before_process():
-    global base_ds, r95
-    base_ds = merge_base_years_period("pr", full_year=False)
-    r95 = percentile_doy(base_ds["pr"], per=95).sel(percentiles=95)
+    global r95
+    r95 = get_doy_threshold("pr", per=95)
 
 def process_r95p(ds: xr.Dataset):
     result = days_over_precip_thresh(ds["pr"], r95, freq="YS")
@@ -37,15 +38,15 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
         before_process()
-        range_data_period("pr", process_r95p, mean_by_region)
+        range_data_period(input_variables, process_r95p, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
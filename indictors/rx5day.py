@@ -5,22 +5,24 @@ from utils import (
     get_origin_result_data_path,
     range_data_period,
     mean_by_region,
-    reindex_ds_to_all_year,
     merge_intermediate_post_process,
     merge_intermediate,
 )
+from common.season import get_season_freq
 from plot import draw_latlon_map, add_title
-from config import pr_colormap
+from config import pr_colormap, mode
 
-default_value = 0
 indicator_name = "rx5day"
 unit = "mm"
 show_name = "RX5day"
+input_variables = ["pr"]
+region_reduce = mean_by_region
 
 
 def process_rx5day(ds: xr.Dataset):
-    ds = reindex_ds_to_all_year(ds, default_value)
-    result = max_n_day_precipitation_amount(ds["pr"], window=5)
+    result = max_n_day_precipitation_amount(
+        ds["pr"], window=5, freq=get_season_freq()
+    )
     result.name = indicator_name
     return result
 
@@ -30,14 +32,14 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("pr", process_rx5day, mean_by_region)
+        range_data_period(input_variables, process_rx5day, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
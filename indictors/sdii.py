@@ -1,41 +1,27 @@
 import xarray as xr
 import pandas as pd
-from xclim.indicators.atmos import daily_pr_intensity
+from xclim.indices import daily_pr_intensity
 from utils import (
     get_origin_result_data_path,
     range_data_period,
     mean_by_region,
-    reindex_ds_to_all_year,
     merge_intermediate_post_process,
     merge_intermediate,
 )
+from common.season import get_season_freq, mask_missing
 from plot import draw_latlon_map, add_title
-from config import pr_colormap
+from config import pr_colormap, mode
 
 indicator_name = "sdii"
-default_value = 0
 show_name = "SDII"
-# 非闰年
-# 调整前    调整后
-# 10/01 -> 01/01
-# 11/01 -> 02/01
-# 11/29 -> 03/01
-# 12/30 -> 04/01
-
-# 闰年
-# 调整前    调整后
-# 10/01 -> 01/01
-# 11/01 -> 02/01
-# 11/30 -> 03/01
-# 12/31 -> 04/01
-
-default_value = 0
+input_variables = ["pr"]
+region_reduce = mean_by_region
 unit = "mm \cdot d^{-1}"
 
 
 def process_sdii(ds: xr.Dataset):
-    ds = reindex_ds_to_all_year(ds, default_value)
-    result = daily_pr_intensity(ds["pr"])
+    result = daily_pr_intensity(ds["pr"], thresh="1 mm/day", freq=get_season_freq())
+    result = mask_missing(result, ds["pr"])
     result.name = indicator_name
     return result
 
@@ -45,14 +31,14 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("pr", process_sdii, mean_by_region)
+        range_data_period(input_variables, process_sdii, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -1,29 +1,30 @@
 import xarray as xr
-from xclim.core.calendar import percentile_doy
 import pandas as pd
 from xclim.indices import tn10p
 from utils import (
-    merge_base_years_period,
     get_origin_result_data_path,
     merge_intermediate_post_process,
     range_data_period,
     mean_by_region,
     merge_intermediate,
 )
+from common.threshold import get_doy_threshold
 from plot import draw_latlon_map, add_title
-from config import tas_colormap
+from config import tas_colormap, mode
 
-base_ds = None
 t10 = None
 
 indicator_name = "tn10p"
 unit = "d"
 show_name = "TN10p"
+input_variables = ["tasmin"]
+region_reduce = mean_by_region
+# 子进程并行计算时需要从主进程广播的全局变量
+shared_state = ["t10"]
 
 def before_process():
-    global base_ds, t10
-    base_ds = merge_base_years_period("tasmin", full_year=False)
-    t10 = percentile_doy(base_ds["tasmin"], per=10, window=5).sel(percentiles=10)
+    global t10
+    t10 = get_doy_threshold("tasmin", per=10, window=5)
 
 def process_tn10p(ds: xr.Dataset):
     result = tn10p(ds["tasmin"], t10, freq="YS")
@@ -36,15 +37,15 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
         before_process()
-        range_data_period("tasmin", process_tn10p, mean_by_region)
+        range_data_period(input_variables, process_tn10p, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
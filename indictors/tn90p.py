@@ -1,29 +1,30 @@
 import xarray as xr
-from xclim.core.calendar import percentile_doy
 import pandas as pd
 from xclim.indices import tn90p
 from utils import (
-    merge_base_years_period,
     get_origin_result_data_path,
     range_data_period,
     mean_by_region,
     merge_intermediate_post_process,
     merge_intermediate,
 )
+from common.threshold import get_doy_threshold
 from plot import draw_latlon_map, add_title
-from config import tas_colormap
+from config import tas_colormap, mode
 
-base_ds = None
 t90 = None
 
 indicator_name = "tn90p"
 unit = "d"
 show_name = "TN90p"
+input_variables = ["tasmin"]
+region_reduce = mean_by_region
+# 子进程并行计算时需要从主进程广播的全局变量
+shared_state = ["t90"]
 
 def before_process():
-    global base_ds, t90
-    base_ds = merge_base_years_period("tasmin", full_year=False)
-    t90 = percentile_doy(base_ds["tasmin"], per=90, window=5).sel(percentiles=90)
+    global t90
+    t90 = get_doy_threshold("tasmin", per=90, window=5)
 
 
 def process_tn90p(ds: xr.Dataset):
@@ -37,15 +38,15 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
         before_process()
-        range_data_period("tasmin", process_tn90p, mean_by_region)
+        range_data_period(input_variables, process_tn90p, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -9,16 +9,19 @@ from utils import (
     merge_intermediate,
 )
 from plot import draw_latlon_map, add_title
-from config import tas_colormap
+from config import tas_colormap, mode
 
 indicator_name = "tnn"
 unit = "°C"
 show_name = "TNN"
+input_variables = ["tasmin"]
+region_reduce = mean_by_region
 
 
 def process_tnn(ds: xr.Dataset):
-    ds["tasmin"].values -= 273.15
-    result = tn_min(ds["tasmin"], freq="YS")
+    # 不原地修改输入，融合计算时多个指标共享同一份数据
+    tasmin = (ds["tasmin"] - 273.15).assign_attrs(ds["tasmin"].attrs)
+    result = tn_min(tasmin, freq="YS")
     result.name = indicator_name
     return result.min(dim="time")
 
@@ -28,14 +31,14 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("tasmin", process_tnn, mean_by_region)
+        range_data_period(input_variables, process_tnn, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -1,30 +1,31 @@
 import xarray as xr
-from xclim.core.calendar import percentile_doy
 import pandas as pd
 from xclim.indices import tx90p
 from utils import (
     merge_intermediate_post_process,
-    merge_base_years_period,
     get_origin_result_data_path,
     range_data_period,
     mean_by_region,
     merge_intermediate,
 )
+from common.threshold import get_doy_threshold
 from plot import draw_latlon_map, add_title
-from config import tas_colormap
+from config import tas_colormap, mode
 
 # tasmax
-base_ds = None
 t90 = None
 
 indicator_name = "tx90p"
 show_name = "TX90p"
 unit = "d"
+input_variables = ["tasmax"]
+region_reduce = mean_by_region
+# 子进程并行计算时需要从主进程广播的全局变量
+shared_state = ["t90"]
 
 def before_process():
-    global base_ds, t90
-    base_ds = merge_base_years_period("tasmax", full_year=False)
-    t90 = percentile_doy(base_ds["tasmax"], per=90, window=5).sel(percentiles=90)
+    global t90
+    t90 = get_doy_threshold("tasmax", per=90, window=5)
 
 def process_tx90p(ds: xr.Dataset):
     result = tx90p(ds["tasmax"], t90, freq="YS")
@@ -37,15 +38,15 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
         before_process()
-        range_data_period("tasmax", process_tx90p, mean_by_region)
+        range_data_period(input_variables, process_tx90p, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -9,17 +9,20 @@ from utils import (
     merge_intermediate,
 )
 from plot import draw_latlon_map, add_title
-from config import tas_colormap
+from config import tas_colormap, mode
 
 indicator_name = "txx"
 unit = "°C"
 show_name = "TXx"
+input_variables = ["tasmax"]
+region_reduce = mean_by_region
 
 
 def process_txx(ds: xr.Dataset):
-    ds["tasmax"].values -= 273.15
+    # 不原地修改输入，融合计算时多个指标共享同一份数据
+    tasmax = (ds["tasmax"] - 273.15).assign_attrs(ds["tasmax"].attrs)
     result = tx_max(
-        ds["tasmax"],
+        tasmax,
         freq="YS",
     )
     result.name = indicator_name
@@ -31,14 +34,14 @@ def draw(df: pd.DataFrame, ax=None):
     add_title(ax, f"{show_name} (${unit}$)")
 
 
-def calculate(process: bool = True):
+def calculate(process: bool = True, local_mode: str = mode):
     if process:
-        range_data_period("tasmax", process_txx, mean_by_region)
+        range_data_period(input_variables, process_txx, region_reduce, local_mode)
 
-    df_post_process = merge_intermediate_post_process(indicator_name)
+    df_post_process = merge_intermediate_post_process(indicator_name, local_mode)
     df_post_process.to_csv(
-        get_origin_result_data_path(indicator_name + "_post_process")
+        get_origin_result_data_path(indicator_name + "_post_process", local_mode)
     )
 
-    df = merge_intermediate(indicator_name)
-    df.to_csv(get_origin_result_data_path(indicator_name))
+    df = merge_intermediate(indicator_name, local_mode)
+    df.to_csv(get_origin_result_data_path(indicator_name, local_mode))
@@ -1,4 +1,17 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from logging import getLogger, StreamHandler, Formatter
+from pathlib import Path
+
+import psutil
+
+from config import profile_file
 
 logger = getLogger("main")
 logger.setLevel("INFO")
@@ -16,4 +29,166 @@ def error(msg):
     logger.error(msg)
     
 def warn(msg):
-    logger.warning(msg)
\ No newline at end of file
+    logger.warning(msg)
+
+
+# 同一次运行的子进程继承环境变量，记录写入同一个 run
+run_id = os.environ.setdefault(
+    "ETCCDI_PROFILE_RUN", f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+)
+profile_lock = threading.Lock()
+profile_stack = threading.local()
+
+
+def get_peak_rss(process: psutil.Process) -> int:
+    # 进程启动以来的内存峰值
+    memory = process.memory_info()
+    if hasattr(memory, "peak_wset"):
+        return memory.peak_wset
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def get_io_bytes(process: psutil.Process) -> tuple:
+    # macOS 不提供进程读写量
+    if not hasattr(process, "io_counters"):
+        return None, None
+    counters = process.io_counters()
+    return counters.read_bytes, counters.write_bytes
+
+
+def get_profile_path() -> Path:
+    # 每个进程写各自的文件，多进程追加同一个文件时行可能交错
+    path = Path(profile_file)
+    return path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+
+
+def get_profile_paths() -> list:
+    path = Path(profile_file)
+    paths = sorted(path.parent.glob(f"{path.stem}.*{path.suffix}"))
+    return ([path] if path.exists() else []) + paths
+
+
+def write_profile_record(record: dict):
+    if profile_file is None:
+        return
+    path = get_profile_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with profile_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+@contextmanager
+def profile(stage: str, **fields):
+    """Record wall time, CPU time, memory and disk I/O of the enclosed stage.
+
+    One JSON line per stage is appended to the ``profile_file`` of the
+    process (``profile.<pid>.jsonl``). ``peak_rss`` is
+    the high-water mark of the process when the stage ends and
+    ``peak_increase`` how much the stage raised it. Nested stages carry the
+    enclosing ones in ``path``.
+    """
+    stack = profile_stack.__dict__.setdefault("stages", [])
+    stack.append(stage)
+    process = psutil.Process()
+    peak = get_peak_rss(process)
+    read_bytes, write_bytes = get_io_bytes(process)
+    cpu = time.process_time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        end_read, end_write = get_io_bytes(process)
+        rss = process.memory_info().rss
+        end_peak = max(get_peak_rss(process), rss)
+        record = {
+            "run": run_id,
+            "pid": os.getpid(),
+            "stage": stage,
+            "path": "/".join(stack),
+            "wall": round(wall, 4),
+            "cpu": round(cpu, 4),
+            "rss": rss,
+            "peak_rss": end_peak,
+            "peak_increase": end_peak - peak,
+            "read_bytes": None if read_bytes is None else end_read - read_bytes,
+            "write_bytes": None if write_bytes is None else end_write - write_bytes,
+            **fields,
+        }
+        stack.pop()
+        write_profile_record(record)
+
+
+def profiled(func: callable) -> callable:
+    """Decorator form of ``profile``, the stage is named after the function."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def load_profile_records(run: str = run_id) -> list:
+    if profile_file is None:
+        return []
+    records = []
+    malformed = 0
+    for path in get_profile_paths():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                # 进程被中断时可能留下写了一半的行
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    malformed += 1
+    if malformed > 0:
+        warn(f"skipped {malformed} malformed profile records")
+    return [record for record in records if run is None or record.get("run") == run]
+
+
+def print_profile_summary(run: str = run_id):
+    """Log per-stage totals of ``run``, slowest first.
+
+    Stages recorded with an ``indictor`` field are listed per indicator.
+    Nested stages are included in their parents, so the totals overlap.
+    """
+    stages = {}
+    for record in load_profile_records(run):
+        # 按指标区分同名阶段
+        stage = record["stage"]
+        if record.get("indictor"):
+            stage = f"{stage}[{record['indictor']}]"
+        total = stages.setdefault(
+            stage,
+            {"count": 0, "wall": 0, "cpu": 0, "peak_rss": 0, "read": 0, "write": 0},
+        )
+        total["count"] += 1
+        total["wall"] += record["wall"]
+        total["cpu"] += record["cpu"]
+        total["peak_rss"] = max(total["peak_rss"], record["peak_rss"])
+        total["read"] += record["read_bytes"] or 0
+        total["write"] += record["write_bytes"] or 0
+    if len(stages) == 0:
+        return
+
+    info(f"profile of run {run}")
+    info(
+        f"{'stage':<40}{'count':>7}{'wall s':>11}{'cpu s':>11}"
+        f"{'peak MiB':>10}{'read MiB':>10}{'write MiB':>10}"
+    )
+    for stage, total in sorted(stages.items(), key=lambda x: -x[1]["wall"]):
+        info(
+            f"{stage:<40}{total['count']:>7}"
+            f"{total['wall']:>11.2f}{total['cpu']:>11.2f}"
+            f"{total['peak_rss'] / 2**20:>10.0f}{total['read'] / 2**20:>10.1f}"
+            f"{total['write'] / 2**20:>10.1f}"
+        )
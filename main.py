@@ -1,31 +1,61 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-from pathlib import Path
 from utils import (
     get_origin_result_data_path,
+    get_origin_result_cube_path,
     get_outlier_result_data_path,
+    get_indictor_fingerprint,
+    get_result_fingerprint_store,
+    get_indictor_inputs,
     import_indictor,
+    range_data_period_multi,
 )
 
-from config import use_cache, mode, indictor_list
-from plot import (map_plot, line_plot, map_plot_multi_mode, line_plot_by_zone)
+from config import (
+    use_cache,
+    mode,
+    indictor_list,
+    fused_calculate,
+    mode_workers,
+    export_merged_csv,
+)
+from plot import (
+    map_plot,
+    line_plot,
+    map_plot_multi_mode,
+    line_plot_by_zone,
+    trend_map_plot,
+)
 from common.outlier import process_outlier_grid_all
 from common.reshape import split_data_by_column
 from common.delta_change import process_delta_change_all
-from logutil import info, error, warn
+from common.trend import process_grid_trend
+from common.cube import write_cube
+from common.execution import setup_execution, teardown_execution
+from logutil import info, error, warn, profile, profiled, print_profile_summary
 
-local_mode = mode
-def calculate_indictors(indictor_list: list):
+
+def calculate_indictors(indictor_list: list, local_mode: str = mode):
+    fingerprints = get_result_fingerprint_store(local_mode)
     for indictor in indictor_list:
-        target = get_origin_result_data_path(indictor)
+        target = get_origin_result_data_path(indictor, local_mode)
         print(target)
-        if use_cache and Path(target).exists():
+        module = import_indictor(indictor)
+        if use_cache and fingerprints.is_current(
+            target, get_indictor_fingerprint(module, local_mode)
+        ):
             info(f"{indictor} already exists")
             continue
 
-        module = import_indictor(indictor)
         if hasattr(module, "calculate"):
             try:
-                module.calculate()
+                with profile("calculate", indictor=indictor, mode=local_mode):
+                    module.calculate(local_mode=local_mode)
+                fingerprints.record(
+                    target, get_indictor_fingerprint(module, local_mode)
+                )
                 info(f"{indictor} calculate success")
             except Exception as e:
                error(f"Error executing {indictor}: {e}")
@@ -33,10 +63,81 @@ def calculate_indictors(indictor_list: list):
             warn(f"Function 'calculate' not found in {indictor}")
 
 
-def merge_post_process_indictors(indictor_list: list):
+def group_indictors_by_variables(
+    modules: dict, local_mode: str = mode
+) -> list[list[str]]:
+    # 输入变量有交集的指标归为一组，每组的每个季节只读取一次
+    groups = []
+    for indictor, module in modules.items():
+        variables = set(get_indictor_inputs(module, local_mode)[0])
+        merged = [indictor]
+        for group in groups[:]:
+            if variables & group[0]:
+                variables |= group[0]
+                merged += group[1]
+                groups.remove(group)
+        groups.append((variables, merged))
+
+    return [members for _, members in groups]
+
+
+def calculate_indictors_fused(indictor_list: list, local_mode: str = mode):
+    fingerprints = get_result_fingerprint_store(local_mode)
+    modules = {}
+    for indictor in indictor_list:
+        target = get_origin_result_data_path(indictor, local_mode)
+        module = import_indictor(indictor)
+        if use_cache and fingerprints.is_current(
+            target, get_indictor_fingerprint(module, local_mode)
+        ):
+            info(f"{indictor} already exists")
+            continue
+
+        if not hasattr(module, "input_variables"):
+            warn(f"{indictor} does not declare input_variables, calculate separately")
+            calculate_indictors([indictor], local_mode)
+            continue
+        modules[indictor] = module
+
+    for members in group_indictors_by_variables(modules, local_mode):
+        tasks = {}
+        var_list = []
+        for indictor in members:
+            module = modules[indictor]
+            try:
+                if hasattr(module, "before_process"):
+                    module.before_process()
+            except Exception as e:
+                error(f"Error executing {indictor}: {e}")
+                continue
+            variables, process = get_indictor_inputs(module, local_mode)
+            tasks[indictor] = (variables, process, module.region_reduce)
+            var_list += [v for v in variables if v not in var_list]
+
+        if len(tasks) == 0:
+            continue
+        info(f"calculate {list(tasks)} with {var_list} for {local_mode}")
+        failed = range_data_period_multi(var_list, tasks, local_mode)
+        for indictor in tasks:
+            if indictor in failed:
+                continue
+            try:
+                with profile("calculate", indictor=indictor, mode=local_mode):
+                    modules[indictor].calculate(process=False, local_mode=local_mode)
+                fingerprints.record(
+                    get_origin_result_data_path(indictor, local_mode),
+                    get_indictor_fingerprint(modules[indictor], local_mode),
+                )
+                info(f"{indictor} calculate success")
+            except Exception as e:
+                error(f"Error executing {indictor}: {e}")
+
+
+@profiled
+def merge_post_process_indictors(indictor_list: list, local_mode: str = mode):
     df_list = [
         pd.read_csv(
-            get_origin_result_data_path(indictor + "_post_process"),
+            get_origin_result_data_path(indictor + "_post_process", local_mode),
             index_col=["name", "year"],
         ).rename(columns={"value": indictor})
         for indictor in indictor_list
@@ -45,34 +146,101 @@ def merge_post_process_indictors(indictor_list: list):
     combined_df = pd.concat(df_list, axis=1)
     combined_df = combined_df[combined_df.index.get_level_values("year") >= 1980]
     combined_df.to_csv(
-        get_origin_result_data_path("all_post_process"), float_format="%.2f"
+        get_origin_result_data_path("all_post_process", local_mode),
+        float_format="%.2f",
     )
     return combined_df
 
 
-def merge_indictors(indictor_list: list):
+@profiled
+def merge_indictors(indictor_list: list, local_mode: str = mode):
     df_list = [
         pd.read_csv(
-            get_origin_result_data_path(indictor), index_col=["lat", "lon", "year"]
+            get_origin_result_data_path(indictor, local_mode),
+            index_col=["lat", "lon", "year"],
         )[indictor]
         for indictor in indictor_list
     ]
 
     combined_df = pd.concat(df_list, axis=1)
     combined_df = combined_df[combined_df.index.get_level_values("year") >= 1980]
-    combined_df.to_csv(get_origin_result_data_path("all"), float_format="%.2f")
-    combined_df.groupby(["lat", "lon"]).mean().to_csv(
-        get_origin_result_data_path("all_mean"), float_format="%.2f"
-    )
-    return combined_df
-            
-if __name__ == "__main__":
-    calculate_indictors(indictor_list)
-    merge_indictors(indictor_list)
-    df = merge_post_process_indictors(indictor_list)
-    if mode == "era5":
-        process_outlier_grid_all(df)
+    cube = write_cube(combined_df, get_origin_result_cube_path("all", local_mode))
+    if export_merged_csv:
+        combined_df.to_csv(
+            get_origin_result_data_path("all", local_mode), float_format="%.2f"
+        )
+        combined_df.groupby(["lat", "lon"]).mean().to_csv(
+            get_origin_result_data_path("all_mean", local_mode), float_format="%.2f"
+        )
+    return cube
+
+
+def prepare_shared(indictor_list: list):
+    # 阈值等与情景无关的结果在主进程中算好并落盘，各情景直接复用
+    for indictor in indictor_list:
+        module = import_indictor(indictor)
+        if hasattr(module, "before_process"):
+            module.before_process()
+
+
+def run_mode(local_mode: str, indictor_list: list):
+    info(f"Processing {local_mode}")
+    with profile("run_mode", mode=local_mode):
+        if fused_calculate:
+            calculate_indictors_fused(indictor_list, local_mode)
+        else:
+            calculate_indictors(indictor_list, local_mode)
+        cube = merge_indictors(indictor_list, local_mode)
+        process_grid_trend(cube, local_mode)
+        df = merge_post_process_indictors(indictor_list, local_mode)
+        if local_mode == "era5":
+            process_outlier_grid_all(df, local_mode=local_mode)
+        map_plot(indictor_list, local_mode=local_mode)
+        trend_map_plot(indictor_list, local_mode=local_mode)
+
+
+def run_modes(modes: list, indictor_list: list, workers: int = 1):
+    if workers > 1 and len(modes) > 1:
+        prepare_shared(indictor_list)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                local_mode: pool.submit(run_mode, local_mode, indictor_list)
+                for local_mode in modes
+            }
+            for local_mode, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    error(f"Error processing {local_mode}: {e}")
     else:
+        # 单个情景失败不影响其余情景
+        for local_mode in modes:
+            try:
+                run_mode(local_mode, indictor_list)
+            except Exception as e:
+                error(f"Error processing {local_mode}: {e}")
+
+    if any(local_mode != "era5" for local_mode in modes):
         process_delta_change_all(post_process=True)
-    map_plot(indictor_list, local_mode=mode)
-    line_plot(indictor_list, post_process=True)
\ No newline at end of file
+    line_plot(indictor_list, post_process=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate climate indicators")
+    parser.add_argument(
+        "modes", nargs="*", default=[mode], help="scenarios to run, e.g. era5 ssp245"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=mode_workers,
+        help="number of scenarios processed in parallel",
+    )
+    args = parser.parse_args()
+
+    setup_execution()
+    try:
+        run_modes(args.modes, indictor_list, args.workers)
+    finally:
+        teardown_execution()
+    print_profile_summary()
\ No newline at end of file
@@ -11,6 +11,8 @@ from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
 
 from scipy.stats import linregress
 from common.delta_change import delta_change
+from common.trend import calculate_trend, load_trend, load_grid_trend
+from common.cube import load_cube, cube_to_frame
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -21,10 +23,11 @@ from utils import (
     get_gdf_list,
     find_region_by_name,
     get_origin_result_data_path,
-    get_origin_result_data_path_by_mode,
+    get_origin_result_cube_path,
     get_outlier_result_data_path,
     get_delta_change_result_data_path_by_mode,
     get_outlier_result_data_path_by_mode,
+    get_trend_result_data_path,
     import_indictor,
     load_daily_data,
     filter_by_year,
@@ -32,6 +35,7 @@ from utils import (
     num2zh,
 )
 from config import zone_list, target_crs, gdf_crs, mode, mode_list, mode_show_name
+from logutil import profile, profiled
 
 province_full_geojson = "static/xinjiang_full.json"
 province_border_geojson = "static/xinjiang.json"
@@ -173,8 +177,16 @@ def draw_base_map(gdf: gpd.GeoDataFrame = None, clip=True, ax=None):
     add_scaler(ax, length=200)
 
 
+def get_latlon_slice(da: xr.DataArray, variable: str, bounds: tuple) -> xr.DataArray:
+    minx, miny, maxx, maxy = bounds
+    da = da.sel(indictor=variable) if "indictor" in da.dims else da
+    da = da.sortby(["lat", "lon"])
+    da = da.sel(lat=slice(miny, maxy), lon=slice(minx, maxx))
+    return da.transpose("lat", "lon")
+
+
 def draw_latlon_map(
-    df: pd.DataFrame,
+    df: pd.DataFrame | xr.DataArray,
     variable: str,
     clip=True,
     cmap="coolwarm",
@@ -182,6 +194,7 @@ def draw_latlon_map(
     levels=15,
     show_colorbar=True,
     country_list=None,
+    significant: xr.DataArray = None,
 ):
     if ax is None:
         _, ax = new_plot(subregions=country_list)
@@ -189,18 +202,36 @@ def draw_latlon_map(
     gdf = gpd.read_file(province_border_geojson)
     draw_base_map(gdf, clip=clip, ax=ax)
     (minx, miny, maxx, maxy) = get_bounds(gdf, margin=0.25)
-    df = df[
-        (df["lat"] >= miny)
-        & (df["lat"] <= maxy)
-        & (df["lon"] >= minx)
-        & (df["lon"] <= maxx)
-    ]
-    lats = df["lat"].values
-    lons = df["lon"].values
-    LON, LAT = np.meshgrid(np.unique(lons), np.unique(lats))
-    VALUE = df.pivot(index="lat", columns="lon", values=variable).values
+    if isinstance(df, xr.DataArray):
+        # 格网数组（如格网趋势）直接取 (lat, lon) 切片
+        da = get_latlon_slice(df, variable, (minx, miny, maxx, maxy))
+        LON, LAT = np.meshgrid(da["lon"].values, da["lat"].values)
+        VALUE = da.values
+    else:
+        df = df[
+            (df["lat"] >= miny)
+            & (df["lat"] <= maxy)
+            & (df["lon"] >= minx)
+            & (df["lon"] <= maxx)
+        ]
+        lats = df["lat"].values
+        lons = df["lon"].values
+        LON, LAT = np.meshgrid(np.unique(lons), np.unique(lats))
+        VALUE = df.pivot(index="lat", columns="lon", values=variable).values
 
     contour = ax.contourf(LON, LAT, VALUE, levels=levels, cmap=cmap, transform=gdf_crs)
+    if significant is not None:
+        # 显著的格网打点
+        mask = get_latlon_slice(significant, variable, (minx, miny, maxx, maxy))
+        ax.contourf(
+            LON,
+            LAT,
+            mask.values.astype(float),
+            levels=[0.5, 1.5],
+            colors="none",
+            hatches=[".."],
+            transform=gdf_crs,
+        )
     if clip:
         geom = ax.projection.project_geometry(gdf.geometry.unary_union, gdf_crs)
         path = Path.make_compound_path(*geos_to_path(geom))
@@ -441,21 +472,33 @@ def draw_line(ax: plt.Axes):
     ax.add_feature(shape_feature)
 
 
-def calculate_slope(df: pd.DataFrame, method="yue_wang_mk", save_path: str = None, with_value: bool = True):
-    def process_slope_by_yue_wang_mk(county_df: pd.DataFrame):
-        import pymannkendall as mk
+def calculate_slope_by_yue_wang_mk(
+    df: pd.DataFrame, with_value: bool = True, cache_path: str = None
+) -> pd.DataFrame:
+    # 所有县和指标一次批量检验，给出 cache_path 时复用缓存的检验结果
+    columns = [c for c in df.columns if c not in ["year", "name"]]
+    if cache_path is None:
+        trend = calculate_trend(df, "name", columns)
+    else:
+        trend = load_trend(df, cache_path, "name", columns)
+
+    result = {}
+    for c in columns:
+        stats = trend.xs(c, level="indictor")
+        if with_value:
+            result[c] = np.round(stats["slope"] * 10, 2)
+        result[c + "_up"] = stats["s"] > 0
+        result[c + "_sign"] = stats["p"] < 0.05
+    return pd.DataFrame(result)
 
-        result = pd.Series()
-        for c in county_df.columns:
-            if c == "year" or c == "name":
-                continue
-            mk_result = mk.yue_wang_modification_test(county_df[c])
-            if with_value:
-                result[c] = round(mk_result.slope * 10, 2)
-            result[c + "_up"] = mk_result.s > 0
-            result[c + "_sign"] = mk_result.p < 0.05
-        return result
 
+def calculate_slope(
+    df: pd.DataFrame,
+    method="yue_wang_mk",
+    save_path: str = None,
+    with_value: bool = True,
+    cache_path: str = None,
+):
     def process_slope_by_linregress(county_df: pd.DataFrame):
         result = pd.Series()
         for c in county_df.columns:
@@ -469,32 +512,43 @@ def calculate_slope(df: pd.DataFrame, method="yue_wang_mk", save_path: str = Non
         return result
 
     if method == "yue_wang_mk":
-        process_slope = process_slope_by_yue_wang_mk
+        slope_result = calculate_slope_by_yue_wang_mk(df, with_value, cache_path)
     elif method == "linregress":
-        process_slope = process_slope_by_linregress
+        slope_result = df.groupby("name").apply(process_slope_by_linregress)
     else:
         raise ValueError("method not support")
 
-    slope_result = df.groupby("name").apply(process_slope)
     if save_path is not None:
         slope_result.to_csv(save_path)
     return slope_result
 
 
+def get_map_point_path(local_mode: str) -> str:
+    # 只有 era5 做异常值处理，情景直接用合并后的县级结果
+    if local_mode == "era5":
+        return get_outlier_result_data_path_by_mode("all", local_mode)
+    return get_origin_result_data_path("all_post_process", local_mode)
+
+
+@profiled
 def map_plot(indictor_list: list, col=3, local_mode="era5", target=None):
-    point_df = pd.read_csv(get_outlier_result_data_path_by_mode("all", local_mode))
-    slope = calculate_slope(point_df)
+    point_df = pd.read_csv(get_map_point_path(local_mode))
+    slope = calculate_slope(
+        point_df, cache_path=get_trend_result_data_path("all", local_mode)
+    )
     slope = add_region_latlon(slope)
 
-    csv_path = get_origin_result_data_path_by_mode("all_mean", local_mode)
-    df = pd.read_csv(csv_path)
+    # 各格网多年平均，按指标切片直接绘制
+    cube = load_cube(get_origin_result_cube_path("all", local_mode))
+    df = cube.mean("year")
     fig = plt.figure(figsize=(24, 48))
     i = 0
     row = len(indictor_list) // col + (1 if len(indictor_list) % col != 0 else 0)
     for indictor in indictor_list:
         module = import_indictor(indictor)
         ax = fig.add_subplot(row, col, i + 1, projection=target_crs)
-        module.draw(df, ax)
+        with profile("draw", indictor=indictor, mode=local_mode):
+            module.draw(df, ax)
 
         if hasattr(module, "unit"):
             add_point_map(
@@ -513,6 +567,28 @@ def map_plot(indictor_list: list, col=3, local_mode="era5", target=None):
     plt.savefig(target, dpi=300)
 
 
+@profiled
+def trend_map_plot(indictor_list: list, col=3, local_mode="era5", target=None):
+    # 各格网的趋势（每 10 年），通过显著性检验的格网打点
+    trend = load_grid_trend(local_mode)
+    slope = trend["slope"] * 10
+    fig = plt.figure(figsize=(24, 48))
+    row = len(indictor_list) // col + (1 if len(indictor_list) % col != 0 else 0)
+    for i, indictor in enumerate(indictor_list):
+        module = import_indictor(indictor)
+        ax = fig.add_subplot(row, col, i + 1, projection=target_crs)
+        with profile("draw_trend", indictor=indictor, mode=local_mode):
+            draw_latlon_map(slope, indictor, ax=ax, significant=trend["significant"])
+        if hasattr(module, "unit"):
+            add_title(ax, f"{module.show_name} (${module.unit}\\cdot 10a^{{-1}}$)")
+        else:
+            add_title(ax, module.show_name)
+        add_number(ax, f"({chr(97 + i)})")
+    if target is None:
+        target = f"result_data/trend_map_{local_mode}.png"
+    plt.savefig(target, dpi=300)
+
+
 def drop_unuseful_columns(df: pd.DataFrame):
     if "time" in df.columns:
         df = df.drop(columns=["time"])
@@ -538,6 +614,7 @@ mode_color_map = {
 }
 
 
+@profiled
 def line_plot(indictor_list: list, delta_change=True, post_process=False, target=None):
     fig = plt.figure(figsize=(40, 24))
     ax_dict = {}
@@ -558,10 +635,8 @@ def line_plot(indictor_list: list, delta_change=True, post_process=False, target
                 index_col=["year"],
             ).drop(columns="name")
         else:
-            df = pd.read_csv(
-                get_origin_result_data_path_by_mode("all", local_mode=local_mode),
-                index_col=["year"],
-            )
+            cube = load_cube(get_origin_result_cube_path("all", local_mode))
+            df = cube_to_frame(cube).reset_index(["lat", "lon"])
 
             df = clip_df_data(df)
         df = df.groupby("year")
@@ -617,6 +692,7 @@ def trim_bound_data(data: xr.Dataset) -> xr.Dataset:
     return data.sel(lon=slice(minx, maxx), lat=slice(maxy, miny))
 
 
+@profiled
 def draw_compare_map(indictor_list: list, time: str):
     fig = plt.figure(figsize=(20, 6 * len(indictor_list)))
     year = time.split("-")[0]
@@ -676,6 +752,7 @@ def get_filter(all_data):
     return filter
 
 
+@profiled
 def map_plot_multi_mode(
     indictor_list,
     target="result_data/map_multi_mode.png",
@@ -683,7 +760,14 @@ def map_plot_multi_mode(
     slope = {}
     for mode in mode_list:
         point_df = filter_by_year(get_result_data(mode), mode)
-        slope[mode] = add_region_latlon(calculate_slope(point_df, save_path=f"result_data/{mode}/slope.csv", with_value=False))
+        slope[mode] = add_region_latlon(
+            calculate_slope(
+                point_df,
+                save_path=f"result_data/{mode}/slope.csv",
+                with_value=False,
+                cache_path=get_trend_result_data_path("filter_by_year", mode),
+            )
+        )
 
     i = 0
     row = len(indictor_list)
@@ -742,6 +826,7 @@ rolling_window = 1
 same_y_axis = False
 
 
+@profiled
 def line_plot_by_zone(indictor_list: list, target="result_data/line_by_zone.png"):
     row = 4  # zone count
     col = len(indictor_list)
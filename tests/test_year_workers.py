@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parent.parent
+
+# 在工作目录中运行，其 config.py 覆盖仓库配置；日数据由合成数据代替原始数据生成
+worker_script = """
+import os
+import utils
+from benchmark.synthetic import generate_year, get_grid
+
+lat, lon = get_grid(2.0)
+
+
+def generate_daily_data(variable, year, local_mode):
+    with open("generated.txt", "a") as f:
+        f.write(f"{os.getpid()} {variable} {year}\\n")
+    return generate_year(int(year), lat, lon)[[variable]]
+
+
+utils.generate_daily_data = generate_daily_data
+
+from config import start_year, end_year
+from utils import get_daily_store_years, import_indictor, range_data_period
+
+module = import_indictor("rx1day")
+range_data_period(["pr"], module.process_rx1day, local_mode="era5")
+print("parent", os.getpid())
+print("years", sorted(get_daily_store_years("pr", "era5")))
+"""
+
+
+def test_year_workers_on_cold_store(tmp_path):
+    config = repo_root.joinpath("config.py").read_text(encoding="utf-8-sig")
+    config += """
+start_year = 1991
+end_year = 1993
+mode = "era5"
+use_cache = False
+year_workers = 2
+"""
+    tmp_path.joinpath("config.py").write_text(config, encoding="utf-8")
+    tmp_path.joinpath("static").symlink_to(
+        repo_root.joinpath("static"), target_is_directory=True
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(repo_root)] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", worker_script],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert process.returncode == 0, process.stderr
+
+    lines = dict(line.split(" ", 1) for line in process.stdout.splitlines()[-2:])
+    # 每年只在主进程中生成一次，子进程只读取
+    generated = tmp_path.joinpath("generated.txt").read_text().splitlines()
+    assert {line.split()[0] for line in generated} == {lines["parent"]}
+    assert sorted(line.split(" ", 1)[1] for line in generated) == [
+        "pr 1991",
+        "pr 1992",
+        "pr 1993",
+    ]
+    assert lines["years"] == "['1991', '1992', '1993']"
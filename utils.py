@@ -1,21 +1,27 @@
 import xarray as xr
+import sys
+import functools
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import re
+import calendar
 from datetime import datetime
-from typing import Union
+from typing import Iterator, Union
 import dask
 import zarr
 import pandas as pd
 import geopandas as gpd
-from logutil import info, error
+from logutil import info, error, warn, profile
 import importlib.util as importlib
 import zipfile
 
 from config import (
     era5_data_dir,
+    era5_time_zone_offset,
     result_data_dir,
     intermediate_data_dir,
+    intermediate_format,
     country_list,
     start_year,
     end_year,
@@ -24,16 +30,34 @@ from config import (
     period_start,
     period_end,
     use_cache,
+    year_workers,
     cmip6_data_dir,
     cmip6_model_list,
     deltachange_methods,
+    cmip6_ensemble_spread,
     mode,
     base_mode,
+    daily_store_time_chunk,
+    region_weight_fractional,
+    region_weight_area,
+    crop_to_regions,
+    crop_margin,
+    crop_mask,
+)
+from common.ensemble import EnsembleAccumulator
+from common.execution import fits_in_memory, get_time_chunk
+from common.fingerprint import FingerprintStore, get_code_fingerprint, hash_value
+from common.intermediate import CsvIntermediateStore, ParquetIntermediateStore
+from common.region_weight import (
+    get_cell_edges,
+    get_region_weight,
+    region_mean,
+    region_max,
 )
 
 
 def import_indictor(indictor: str):
-    module_path = f"indictors\\{indictor}.py"
+    module_path = Path(__file__).resolve().parent / "indictors" / f"{indictor}.py"
     spec = importlib.spec_from_file_location(indictor, module_path)
     module = importlib.module_from_spec(spec)
     spec.loader.exec_module(module)
@@ -66,22 +90,54 @@ def load_era5_date(variable: str, year: str) -> xr.Dataset:
     return xr.open_dataset(get_era5_data_path(variable, year))
 
 
-def load_cmip6_data(variable: str, year: str, local_mode: str) -> xr.Dataset:
+def get_era5_adjacent_years(year: str) -> list[int]:
+    return [int(year) - 1, int(year), int(year) + 1]
+
+
+def load_era5_with_boundary(variable: str, year: str) -> xr.Dataset:
+    # 本地时区的当年跨越相邻两年的 UTC 时次，从相邻年份的文件补齐
+    offset = np.timedelta64(era5_time_zone_offset, "h")
+    start = np.datetime64(f"{int(year)}-01-01") - offset
+    stop = np.datetime64(f"{int(year) + 1}-01-01") - offset
     ds_list = []
+    for adjacent in get_era5_adjacent_years(year):
+        path = get_era5_data_path(variable, adjacent)
+        if adjacent != int(year) and not Path(path).exists():
+            continue
+        ds = load_era5_date(variable, adjacent)
+        times = ds["valid_time"].values
+        selected = np.flatnonzero((times >= start) & (times < stop))
+        if adjacent == int(year) or len(selected) > 0:
+            ds_list.append(ds.isel(valid_time=selected))
+    if len(ds_list) == 1:
+        return ds_list[0]
+    return xr.concat(
+        ds_list,
+        dim="valid_time",
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+    )
+
+
+def get_cmip6_data_path(variable: str, model: str, local_mode: str) -> Path:
+    return (
+        Path(cmip6_data_dir)
+        .joinpath(model)
+        .joinpath(f"{variable}_{local_mode}_{model}_{deltachange_methods[variable]}.zarr")
+    )
+
+
+def load_cmip6_data(variable: str, year: str, local_mode: str) -> xr.Dataset:
+    # 逐个模式累加，避免拼接出 model 维后整体求平均
+    ensemble = EnsembleAccumulator(spread=cmip6_ensemble_spread)
     for model in cmip6_model_list:
-        path = (
-            Path(cmip6_data_dir)
-            .joinpath(model)
-            .joinpath(
-                f"{variable}_{local_mode}_{model}_{deltachange_methods[variable]}.zarr"
-            )
-        )
-        ds = xr.open_zarr(path)    
+        ds = xr.open_zarr(get_cmip6_data_path(variable, model, local_mode))
+        ds = ds[[variable]]
         ds = ds.sel(time=slice(f"{year}-01-01", f"{year}-12-31"))
-        ds_list.append(ds)
-    info(f"concat {len(ds_list)} models")
-    concat_ds = xr.concat(ds_list, dim="model")
-    return concat_ds.mean(dim="model")
+        ensemble.add(ds.load())
+    info(f"ensemble mean of {len(cmip6_model_list)} models")
+    return ensemble.result()
 
 
 def get_cf_daily_date_path(variable: str, year: str, local_mode: str):
@@ -90,30 +146,396 @@ def get_cf_daily_date_path(variable: str, year: str, local_mode: str):
     return f"{intermediate_data_dir}/{variable}_cf_daily_{year}_{local_mode}.zarr"
 
 
+def get_cf_daily_store_path(variable: str, local_mode: str):
+    if Path(intermediate_data_dir).exists() == False:
+        Path(intermediate_data_dir).mkdir()
+    return f"{intermediate_data_dir}/{variable}_cf_daily_{local_mode}.zarr"
+
+
+daily_store_cache = {}
+
+
+def open_daily_store(variable: str, local_mode: str) -> xr.Dataset:
+    path = get_cf_daily_store_path(variable, local_mode)
+    if path in daily_store_cache:
+        return daily_store_cache[path]
+    if not Path(path).exists():
+        return None
+
+    # time 维分块按内存预算取 zarr 分块长度的整数倍
+    ds = xr.open_zarr(path)
+    chunk = get_time_chunk(get_bytes_per_day(ds), multiple=daily_store_time_chunk)
+    if chunk != daily_store_time_chunk:
+        ds = xr.open_zarr(path, chunks={"time": chunk, "lat": -1, "lon": -1})
+    daily_store_cache[path] = ds
+    return ds
+
+
+def get_bytes_per_day(ds: xr.Dataset) -> int:
+    return sum(
+        ds[name].dtype.itemsize * ds[name].size // ds.sizes["time"]
+        for name in ds.data_vars
+        if "time" in ds[name].dims
+    )
+
+
+def get_daily_store_years(variable: str, local_mode: str) -> dict:
+    # 年份 -> 该年在 time 维上的 [start, stop) 位置
+    ds = open_daily_store(variable, local_mode)
+    if ds is None:
+        return {}
+    return dict(ds.attrs.get("years", {}))
+
+
+def get_aligned_time_chunks(offset: int, length: int, size: int = None) -> tuple:
+    # 追加写入时让 dask 分块与 zarr 分块边界对齐，避免多个分块写同一个 zarr 分块
+    size = size or daily_store_time_chunk
+    chunks = []
+    first = min(length, daily_store_time_chunk - offset % daily_store_time_chunk)
+    if first > 0:
+        chunks.append(first)
+    while sum(chunks) < length:
+        chunks.append(min(size, length - sum(chunks)))
+    return tuple(chunks)
+
+
+# 各单位下日值的合理范围，超出范围通常是单位换算有误
+unit_ranges = {
+    "K": (150, 350),
+    "mm/day": (0, 2000),
+    "MJ m**-2": (0, 100),
+    "%": (0, 150),
+}
+
+
+def get_validation_stats(da: xr.DataArray) -> dict:
+    # 惰性统计量，与写入 zarr 在同一个 dask 图中计算；置空的县域外格网不计入缺测
+    isnull = da.isnull()
+    crop = get_crop()
+    if crop is not None and crop["mask"]:
+        isnull = isnull & get_region_cell_mask(da["lat"].values, da["lon"].values)
+    return {
+        "null_count": isnull.sum().data,
+        "min": da.min().data,
+        "max": da.max().data,
+    }
+
+
+def summarize_validation_stats(da: xr.DataArray, stats: dict) -> dict:
+    summary = {"null_count": int(stats["null_count"])}
+    for name in ["min", "max"]:
+        value = float(stats[name])
+        summary[name] = None if np.isnan(value) else value
+    summary["days"] = da.sizes["time"]
+    summary["units"] = da.attrs.get("units")
+    return summary
+
+
+def check_daily_stats(variable: str, year: str, stats: dict):
+    if stats["null_count"] > 0:
+        raise ValueError(f"{variable} {year} has {stats['null_count']} null values")
+
+    if stats["min"] is None or stats["max"] is None:
+        raise ValueError(f"{variable} {year} has no valid values")
+
+    if stats["units"] in unit_ranges:
+        lower, upper = unit_ranges[stats["units"]]
+        if stats["min"] < lower or stats["max"] > upper:
+            raise ValueError(
+                f"{variable} {year} range [{stats['min']}, {stats['max']}] "
+                f"out of [{lower}, {upper}] {stats['units']}"
+            )
+
+    days = 366 if calendar.isleap(int(year)) else 365
+    if stats["days"] != days:
+        warn(f"{variable} {year} has {stats['days']} days, expected {days}")
+
+
+def get_daily_store_stats(variable: str, local_mode: str) -> dict:
+    ds = open_daily_store(variable, local_mode)
+    if ds is None:
+        return {}
+    return dict(ds.attrs.get("validation", {}))
+
+
+def update_daily_store_attrs(path: str, attrs: dict):
+    # to_zarr 会覆盖 group 属性，写入后重新记录年份索引、校验统计、来源和裁剪范围
+    zarr.open_group(path, mode="a").attrs.update(attrs)
+    zarr.consolidate_metadata(path)
+    daily_store_cache.pop(path, None)
+
+
+def get_crop() -> dict:
+    # 当前配置下日数据的裁剪范围，记录在日数据 zarr 属性中
+    if not crop_to_regions:
+        return None
+    bounds = np.array([region.geometry.bounds for region in get_region_list()])
+    return {
+        "bounds": [
+            float(bounds[:, 0].min() - crop_margin),
+            float(bounds[:, 1].min() - crop_margin),
+            float(bounds[:, 2].max() + crop_margin),
+            float(bounds[:, 3].max() + crop_margin),
+        ],
+        "mask": crop_mask,
+    }
+
+
+def get_region_cell_mask(lat: np.ndarray, lon: np.ndarray) -> xr.DataArray:
+    # 与任一县域相交的格网，覆盖按面积比例和按格点中心两种统计方式用到的格网
+    regions = get_region_list()
+    weight = get_region_weight(
+        lat,
+        lon,
+        [region["name"] for region in regions],
+        [region.geometry for region in regions],
+        fractional=True,
+    )
+    mask = np.asarray(weight.sum(axis=0)).ravel() > 0
+    return xr.DataArray(mask.reshape(len(lat), len(lon)), dims=["lat", "lon"])
+
+
+def crop_daily_data(ds: xr.Dataset) -> xr.Dataset:
+    crop = get_crop()
+    if crop is None:
+        return ds
+
+    minx, miny, maxx, maxy = crop["bounds"]
+    lat_lower, lat_upper = get_cell_edges(ds["lat"].values)
+    lon_lower, lon_upper = get_cell_edges(ds["lon"].values)
+    ds = ds.isel(
+        lat=np.nonzero((lat_upper > miny) & (lat_lower < maxy))[0],
+        lon=np.nonzero((lon_upper > minx) & (lon_lower < maxx))[0],
+    )
+    if crop["mask"]:
+        mask = get_region_cell_mask(ds["lat"].values, ds["lon"].values)
+        for name in ds.data_vars:
+            if "lat" in ds[name].dims and "lon" in ds[name].dims:
+                ds[name] = ds[name].where(mask)
+    return ds
+
+
+def check_daily_store_crop(variable: str, local_mode: str):
+    ds = open_daily_store(variable, local_mode)
+    if ds is None:
+        return
+    if ds.attrs.get("crop") != get_crop():
+        raise ValueError(
+            f"{get_cf_daily_store_path(variable, local_mode)} is cropped to "
+            f"{ds.attrs.get('crop')}, expected {get_crop()}; remove it to regenerate"
+        )
+
+
+def write_daily_store(
+    ds: xr.Dataset, variable: str, year: str, local_mode: str, source: str = None
+):
+    path = get_cf_daily_store_path(variable, local_mode)
+    check_daily_store_crop(variable, local_mode)
+    years = get_daily_store_years(variable, local_mode)
+    validation = get_daily_store_stats(variable, local_mode)
+    sources = get_daily_store_sources(variable, local_mode)
+    ds = ds.sortby("time")
+    ds.attrs = {}
+    for name in ds.variables:
+        ds[name].encoding = {}
+    length = ds.sizes["time"]
+    size = get_time_chunk(get_bytes_per_day(ds), multiple=daily_store_time_chunk)
+
+    if len(years) == 0:
+        ds = ds.chunk(
+            {"time": get_aligned_time_chunks(0, length, size), "lat": -1, "lon": -1}
+        )
+        encoding = {
+            name: {"chunks": (daily_store_time_chunk,) + ds[name].shape[1:]}
+            for name in ds.data_vars
+            if ds[name].dims[0] == "time"
+        }
+        kwargs = {"mode": "w", "encoding": encoding}
+        years[str(year)] = [0, length]
+    elif str(year) in years:
+        start, stop = years[str(year)]
+        if stop - start != length:
+            raise ValueError(
+                f"{variable} {year} has {length} days, store has {stop - start}"
+            )
+        ds = ds.chunk(
+            {"time": get_aligned_time_chunks(start, length, size), "lat": -1, "lon": -1}
+        )
+        ds = ds.drop_vars([name for name in ds.coords if "time" not in ds[name].dims])
+        kwargs = {"mode": "r+", "region": {"time": slice(start, stop)}}
+    else:
+        start = max(stop for _, stop in years.values())
+        ds = ds.chunk(
+            {"time": get_aligned_time_chunks(start, length, size), "lat": -1, "lon": -1}
+        )
+        kwargs = {"mode": "a", "append_dim": "time"}
+        years[str(year)] = [start, start + length]
+
+    stats = save_to_zarr(ds, path, collect=get_validation_stats(ds[variable]), **kwargs)
+    get_cmip6_source_fingerprint.cache_clear()
+    get_daily_source_fingerprint.cache_clear()
+    validation[str(year)] = summarize_validation_stats(ds[variable], stats)
+    if source is None:
+        sources.pop(str(year), None)
+    else:
+        sources[str(year)] = source
+    update_daily_store_attrs(
+        path,
+        {
+            "years": years,
+            "validation": validation,
+            "sources": sources,
+            "crop": get_crop(),
+        },
+    )
+    return validation[str(year)]
+
+
 def load_daily_data(var_list: Union[list[str], str], year: str, local_mode: str):
     if isinstance(var_list, str):
         var_list = [var_list]
 
-    dataset_list = []
-    for var in var_list:
-        dataset_list.append(load_daily_data_single(var, year, local_mode=local_mode))
+    with profile("load_daily_data", variables=var_list, year=year, mode=local_mode):
+        dataset_list = []
+        for var in var_list:
+            dataset_list.append(
+                load_daily_data_single(var, year, local_mode=local_mode)
+            )
 
-    ds = xr.merge(dataset_list)
+        ds = xr.merge(dataset_list)
     return ds
 
 
+def load_daily_store_year(variable: str, year: str, local_mode: str) -> xr.Dataset:
+    start, stop = get_daily_store_years(variable, local_mode)[str(year)]
+    return open_daily_store(variable, local_mode).isel(time=slice(start, stop))
+
+
+def load_daily_store_stats(variable: str, year: str, local_mode: str) -> dict:
+    validation = get_daily_store_stats(variable, local_mode)
+    if str(year) in validation:
+        return validation[str(year)]
+
+    # 旧版本写入的年份没有校验统计，补算一次后记录到 zarr 属性中
+    da = load_daily_store_year(variable, year, local_mode)[variable]
+    stats = dask.compute(get_validation_stats(da))[0]
+    validation[str(year)] = summarize_validation_stats(da, stats)
+    update_daily_store_attrs(
+        get_cf_daily_store_path(variable, local_mode), {"validation": validation}
+    )
+    return validation[str(year)]
+
+
+def get_file_state(path: Path) -> list:
+    # 以大小和修改时间代表源文件内容，zarr 目录取其元数据文件
+    path = Path(path)
+    if path.joinpath(".zmetadata").exists():
+        path = path.joinpath(".zmetadata")
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return [str(path), stat.st_size, stat.st_mtime]
+
+
+@functools.lru_cache(maxsize=None)
+def get_cmip6_source_fingerprint(variable: str, local_mode: str) -> str:
+    # 所有年份共用同一组模式文件，每个进程只读取一次其元数据状态
+    return hash_value(
+        {
+            "cmip6": [
+                get_file_state(get_cmip6_data_path(variable, model, local_mode))
+                for model in cmip6_model_list
+            ],
+            "spread": cmip6_ensemble_spread,
+        }
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_daily_source_fingerprint(variable: str, year: str, local_mode: str) -> str:
+    """Fingerprint of what ``load_daily_data_single`` would build a year from.
+
+    Memoized for the life of the process; ``write_daily_store`` clears it.
+    """
+    legacy_path = get_cf_daily_date_path(variable, year, local_mode=local_mode)
+    if use_cache and Path(legacy_path).exists():
+        return hash_value({"legacy": get_file_state(legacy_path)})
+    if local_mode == "era5":
+        return hash_value(
+            {
+                "era5": [
+                    get_file_state(get_era5_data_path(variable, adjacent))
+                    for adjacent in get_era5_adjacent_years(year)
+                ],
+                "time_zone": era5_time_zone_offset,
+            }
+        )
+    return get_cmip6_source_fingerprint(variable, local_mode)
+
+
+def get_daily_store_sources(variable: str, local_mode: str) -> dict:
+    ds = open_daily_store(variable, local_mode)
+    if ds is None:
+        return {}
+    return dict(ds.attrs.get("sources", {}))
+
+
+def is_daily_store_current(variable: str, year: str, local_mode: str) -> bool:
+    if str(year) not in get_daily_store_years(variable, local_mode):
+        return False
+    # 没有记录来源的年份（旧版本写入或由其他变量派生）视为有效
+    source = get_daily_store_sources(variable, local_mode).get(str(year))
+    if source is None:
+        return True
+    if source != get_daily_source_fingerprint(variable, year, local_mode):
+        info(f"{variable} {year} {local_mode} source changed, regenerating")
+        return False
+    return True
+
+
+# 年份并行的子进程只读取主进程准备好的日数据缓存
+daily_store_state = {"read_only": False}
+
+
 def load_daily_data_single(variable, year, local_mode: str):
-    path = get_cf_daily_date_path(variable, year, local_mode=local_mode)
-    if use_cache and Path(path).exists():
-        info(f"Using cached {path}")
-        return xr.open_zarr(path)
+    path = get_cf_daily_store_path(variable, local_mode=local_mode)
+    if daily_store_state["read_only"]:
+        # 不生成、不补写校验属性，避免多个进程并发写同一个 zarr
+        if str(year) not in get_daily_store_years(variable, local_mode):
+            raise RuntimeError(f"{variable} {year} is not in {path}")
+        return load_daily_store_year(variable, year, local_mode)
+    if use_cache and is_daily_store_current(variable, year, local_mode):
+        check_daily_store_crop(variable, local_mode)
+        check_daily_stats(
+            variable, year, load_daily_store_stats(variable, year, local_mode)
+        )
+        return load_daily_store_year(variable, year, local_mode)
+
+    legacy_path = get_cf_daily_date_path(variable, year, local_mode=local_mode)
+    if use_cache and Path(legacy_path).exists():
+        info(f"Importing {legacy_path} into {path}")
+        ds = xr.open_zarr(legacy_path)
     else:
-        info(f"Generating {path}")
+        info(f"Generating {variable} {year} in {path}")
+        ds = generate_daily_data(variable, year, local_mode=local_mode)
+
+    # 裁剪后再写入缓存，之后的指标和阈值计算只涉及县域附近的格网
+    ds = crop_daily_data(ds)
+    if variable == "pr":
+        # ERA5 的 GRIB 打包会产生极小的负降水，与 CMIP6 一样截断为 0
+        ds[variable] = ds[variable].clip(min=0)
+    source = get_daily_source_fingerprint(variable, year, local_mode)
+    check_daily_stats(
+        variable, year, write_daily_store(ds, variable, year, local_mode, source)
+    )
+    return load_daily_store_year(variable, year, local_mode)
+
+
+def generate_daily_data(variable, year, local_mode: str) -> xr.Dataset:
     if local_mode == "era5":
-        era5_ds = load_era5_date(variable, year)
-        ds = convert_era5_to_cf_daily(
-            era5_ds.sel(valid_time=slice(f"{year}-01-01", f"{year}-12-31")), variable
-        )
+        # 先换算到本地时区的自然日，再截取当年
+        ds = convert_era5_to_cf_daily(load_era5_with_boundary(variable, year), variable)
+        ds = ds.sel(time=slice(f"{year}-01-01", f"{year}-12-31"))
     else:
         ds = load_cmip6_data(variable, year, local_mode=local_mode)
         if "month" in ds.coords:
@@ -123,76 +545,274 @@ def load_daily_data_single(variable, year, local_mode: str):
         if variable == "pr":
             ds[variable] = xr.where(ds[variable] < 0, 0, ds[variable])
         ds = add_unit_for_cmip6(ds, variable)
-    ds = ds.chunk({"time": 1000, "lat": -1, "lon": -1})
-    save_to_zarr(ds, path)
-    if ds[variable].isnull().any():
-        error(f"{variable} {year} has null")
-        exit(1)
-
     return ds
 
 
-def save_to_zarr(ds: xr.Dataset, path: Path):
-    ds = dask.optimize(ds)[0]
-    t = ds.to_zarr(path, mode="w", compute=False, safe_chunks=False)
-    t.compute(retries=5)
-    zarr.consolidate_metadata(path)
+def save_to_zarr(
+    ds: xr.Dataset, path: Path, mode: str = "w", collect: dict = None, **kwargs
+):
+    """Write ``ds`` to zarr; dask values in ``collect`` are computed in the same
+    pass over the data and returned."""
+    with profile("save_to_zarr", target=path):
+        ds, collect = dask.optimize(ds, collect)
+        t = ds.to_zarr(path, mode=mode, compute=False, safe_chunks=False, **kwargs)
+        _, collect = dask.compute(t, collect, retries=5)
+        zarr.consolidate_metadata(path)
+    return collect
+
+
+def get_intermediate_store(local_mode: str = mode):
+    if intermediate_format == "parquet":
+        return ParquetIntermediateStore(f"{intermediate_data_dir}/parquet", local_mode)
+    return CsvIntermediateStore(
+        functools.partial(get_intermediate_data_path, local_mode=local_mode)
+    )
+
+
+def save_intermediate(
+    ds: xr.DataArray,
+    year: str,
+    postprocess: callable = None,
+    local_mode: str = mode,
+):
+    store = get_intermediate_store(local_mode)
+    df = ds.to_dataframe()
+    with profile("write_intermediate", indictor=ds.name, year=year):
+        store.write(ds.name, year, df)
+    if postprocess:
+        df = postprocess(ds)
+        with profile("write_intermediate", indictor=ds.name, year=year):
+            store.write(ds.name + "_post_process", year, df, index=False)
 
 
 def range_data(
-    var_list: Union[list[str], str], process: callable, postprocess: callable = None
+    var_list: Union[list[str], str],
+    process: callable,
+    postprocess: callable = None,
+    local_mode: str = mode,
 ):
     if isinstance(var_list, str):
         var_list = [var_list]
 
     for year in range(start_year, end_year + 1):
-        ds = process(load_daily_data(var_list, str(year), mode=mode))
-        if ds is None:
-            continue
-        ds.to_dataframe().to_csv(get_intermediate_data_path(ds.name, str(year)))
-        if postprocess:
-            df = postprocess(ds)
-            df.to_csv(
-                get_intermediate_data_path(ds.name + "_post_process", str(year)),
-                index=False,
+        ds = load_daily_data(var_list, str(year), local_mode=local_mode)
+        with profile("process", indictor=process.__module__, year=year):
+            ds = process(ds)
+            if ds is None:
+                continue
+            save_intermediate(ds, year, postprocess, local_mode)
+
+
+def is_cross_year_period() -> bool:
+    return not datetime.strptime(period_start, "%m-%d") < datetime.strptime(
+        period_end, "%m-%d"
+    )
+
+
+def get_period_years() -> range:
+    if is_cross_year_period():
+        return range(start_year + 1, end_year + 1)
+    return range(start_year, end_year + 1)
+
+
+def iter_period_data(
+    var_list: list[str], years: range, local_mode: str
+) -> Iterator[tuple[int, xr.Dataset]]:
+    """Yield ``(year, season)`` for consecutive years, loading each year once.
+
+    For a cross-year season only the tail of the previous year (from
+    ``period_start``) is kept between steps and concatenated with the head of
+    the current year (up to ``period_end``).
+    """
+    if not is_cross_year_period():
+        for year in years:
+            yield year, load_daily_data(var_list, str(year), local_mode=local_mode)
+        return
+
+    last_year = None
+    last_tail = None
+    for year in years:
+        if last_year != year - 1:
+            last_year_ds = load_daily_data(
+                var_list, str(year - 1), local_mode=local_mode
             )
+            last_tail = last_year_ds.sel(time=slice(f"{year - 1}-{period_start}", None))
+
+        this_year_ds = load_daily_data(var_list, str(year), local_mode=local_mode)
+        head = this_year_ds.sel(time=slice(None, f"{year}-{period_end}"))
+        yield year, xr.concat([last_tail, head], dim="time")
+
+        last_year = year
+        last_tail = this_year_ds.sel(time=slice(f"{year}-{period_start}", None))
+
+
+worker_modules = {}
+
+
+def get_function_ref(func: callable) -> tuple[str, str]:
+    # 指标模块由 import_indictor 动态加载，无法直接 pickle，按模块名和函数名传给子进程
+    return func.__module__, func.__name__
+
+
+def resolve_function_ref(ref: tuple[str, str]) -> callable:
+    module_name, func_name = ref
+    if module_name in worker_modules:
+        module = worker_modules[module_name]
+    elif module_name in sys.modules:
+        module = sys.modules[module_name]
+    else:
+        module = import_indictor(module_name)
+        worker_modules[module_name] = module
+    return getattr(module, func_name)
+
+
+def get_shared_state(func: callable) -> dict:
+    # before_process 计算出的阈值等模块全局变量，由主进程计算一次后广播给子进程
+    state = {}
+    for name in func.__globals__.get("shared_state", []):
+        value = func.__globals__[name]
+        if isinstance(value, xr.DataArray):
+            # 惰性计算结果的实际类型可能与声明的 dtype 不同，按声明类型广播以保持与串行一致
+            value = value.compute().astype(value.dtype)
+        state[name] = value
+    return state
+
+
+def init_year_worker(states: dict):
+    dask.config.set(scheduler="synchronous")
+    daily_store_state["read_only"] = True
+    for module_name, state in states.items():
+        module = import_indictor(module_name)
+        for name, value in state.items():
+            setattr(module, name, value)
+        worker_modules[module_name] = module
+
+
+def run_year_task(var_list: list[str], year: int, tasks: dict, local_mode: str) -> dict:
+    errors = {}
+    _, period_ds = next(iter_period_data(var_list, [year], local_mode))
+    if len(tasks) > 1 and fits_in_memory(period_ds.nbytes):
+        period_ds = period_ds.load()
+    for name, (variables, process_ref, postprocess_ref) in tasks.items():
+        try:
+            process = resolve_function_ref(process_ref)
+            postprocess = None
+            if postprocess_ref is not None:
+                postprocess = resolve_function_ref(postprocess_ref)
+            with profile("process", indictor=name, year=year):
+                save_intermediate(
+                    process(period_ds[variables]), year, postprocess, local_mode
+                )
+        except Exception as e:
+            errors[name] = repr(e)
+    return errors
+
+
+def range_years_parallel(
+    var_list: list[str], tasks: dict, local_mode: str = mode
+) -> dict:
+    """Run every season year of ``tasks`` on a pool of ``year_workers`` processes.
+
+    ``tasks`` has the same layout as in ``range_data_period_multi``. Returns
+    ``{name: [failed years]}``; errors are logged in year order.
+    """
+    years = get_period_years()
+    # 所需年份先在主进程中生成或校验（use_cache 关闭时全部重新生成），
+    # 子进程以只读方式打开日数据缓存，不会并发写同一个 zarr
+    warm_years = range(years.start - 1, years.stop) if is_cross_year_period() else years
+    for year in warm_years:
+        load_daily_data(var_list, str(year), local_mode=local_mode)
+
+    states = {}
+    refs = {}
+    for name, (variables, process, postprocess) in tasks.items():
+        if process.__module__ not in sys.modules:
+            states[process.__module__] = get_shared_state(process)
+        refs[name] = (
+            variables,
+            get_function_ref(process),
+            get_function_ref(postprocess) if postprocess else None,
+        )
+
+    failures = {}
+    with ProcessPoolExecutor(
+        max_workers=year_workers, initializer=init_year_worker, initargs=(states,)
+    ) as pool:
+        futures = [
+            (year, pool.submit(run_year_task, var_list, year, refs, local_mode))
+            for year in years
+        ]
+        for year, future in futures:
+            try:
+                errors = future.result()
+            except Exception as e:
+                errors = {name: repr(e) for name in refs}
+            for name, message in errors.items():
+                error(f"Error executing {name} for {year}: {message}")
+                failures.setdefault(name, []).append(year)
+
+    return failures
 
 
 def range_data_period(
-    var_list: Union[list[str], str], process: callable, postprocess: callable = None
+    var_list: Union[list[str], str],
+    process: callable,
+    postprocess: callable = None,
+    local_mode: str = mode,
 ):
     if isinstance(var_list, str):
         var_list = [var_list]
 
-    if datetime.strptime(period_start, "%m-%d") < datetime.strptime(
-        period_end, "%m-%d"
-    ):
-        for year in range(start_year, end_year + 1):
-            ds = process(load_daily_data(var_list, str(year), local_mode=mode))
-            ds.to_dataframe().to_csv(get_intermediate_data_path(ds.name, str(year)))
-            if postprocess:
-                df = postprocess(ds)
-                df.to_csv(
-                    get_intermediate_data_path(ds.name + "_post_process", str(year)),
-                    index=False,
-                )
+    if year_workers > 1:
+        # 以指标模块名为任务名，与合并计算时一致
+        name = process.__module__
+        failures = range_years_parallel(
+            var_list, {name: (var_list, process, postprocess)}, local_mode
+        )
+        if len(failures) != 0:
+            raise RuntimeError(f"{name} failed for years {failures[name]}")
         return
 
-    for year in range(start_year + 1, end_year + 1):
-        last_year_ds = load_daily_data(var_list, str(year - 1), local_mode=mode)
-        this_year_ds = load_daily_data(var_list, str(year), local_mode=mode)
-        merged_ds = xr.concat([last_year_ds, this_year_ds], dim="time")
-        selected_ds = merged_ds.sel(
-            time=slice(f"{year - 1}-{period_start}", f"{year}-{period_end}")
-        )
-        ds = process(selected_ds)
-        ds.to_dataframe().to_csv(get_intermediate_data_path(ds.name, str(year)))
-        if postprocess:
-            df = postprocess(ds)
-            df.to_csv(
-                get_intermediate_data_path(ds.name + "_post_process", str(year)),
-                index=False,
-            )
+    for year, period_ds in iter_period_data(var_list, get_period_years(), local_mode):
+        with profile("process", indictor=process.__module__, year=year):
+            save_intermediate(process(period_ds), year, postprocess, local_mode)
+
+
+def range_data_period_multi(
+    var_list: list[str], tasks: dict, local_mode: str = mode
+) -> list[str]:
+    """Evaluate several indicators against one load of every season window.
+
+    ``tasks`` maps an indicator name to ``(variables, process, postprocess)``.
+    Each season of ``var_list`` is loaded into memory once and every process
+    function receives the subset of variables it declares. An indicator that
+    fails is logged and dropped for the remaining years; the names of failed
+    indicators are returned.
+    """
+    if year_workers > 1:
+        return list(range_years_parallel(var_list, tasks, local_mode))
+
+    failed = []
+    for year, period_ds in iter_period_data(var_list, get_period_years(), local_mode):
+        if len(failed) == len(tasks):
+            break
+        # 内存放不下整个季节时保持惰性，按分块计算
+        if fits_in_memory(period_ds.nbytes):
+            with profile("load_period", variables=var_list, year=year):
+                period_ds = period_ds.load()
+        for name, (variables, process, postprocess) in tasks.items():
+            if name in failed:
+                continue
+            try:
+                with profile("process", indictor=name, year=year):
+                    save_intermediate(
+                        process(period_ds[variables]), year, postprocess, local_mode
+                    )
+            except Exception as e:
+                error(f"Error executing {name} for {year}: {e}")
+                failed.append(name)
+
+    return failed
 
 
 def merge_base_years(var_list: Union[list[str], str]) -> xr.Dataset:
@@ -203,36 +823,48 @@ def merge_base_years(var_list: Union[list[str], str]) -> xr.Dataset:
     return xr.concat(datesets, dim="time", coords="minimal")
 
 
-def merge_base_years_period(
-    var_list: Union[list[str], str], reindex=False, full_year=True, default_value=0
-) -> xr.Dataset:
-    datesets = []
-    if datetime.strptime(period_start, "%m-%d") > datetime.strptime(
-        period_end, "%m-%d"
-    ):
-        for year in range(base_start_year + 1, base_end_year + 1):
-            last_year_ds = load_daily_data(
-                var_list, str(year - 1), local_mode=base_mode
-            )
-            this_year_ds = load_daily_data(var_list, str(year), local_mode=base_mode)
-            merged_ds = xr.concat([last_year_ds, this_year_ds], dim="time")
-            selected_ds = merged_ds.sel(
-                time=slice(f"{year - 1}-{period_start}", f"{year}-{period_end}")
-            )
-            if reindex:
-                datesets.append(
-                    reindex_ds_to_all_year(selected_ds, full_year, default_value)
-                )
-            else:
-                datesets.append(selected_ds)
+base_period_cache = {}
+
+
+def load_base_period(variable: str) -> xr.Dataset:
+    """Base-period seasons of one variable concatenated, loaded once per process.
+
+    The arrays are shared by all callers and marked read-only.
+    """
+    if variable in base_period_cache:
+        return base_period_cache[variable]
+
+    seasons = []
+    if is_cross_year_period():
+        years = range(base_start_year + 1, base_end_year + 1)
+        for _, season in iter_period_data([variable], years, base_mode):
+            seasons.append(season)
     else:
-        for year in range(base_start_year, base_end_year + 1):
-            ds = load_daily_data(var_list, str(year), local_mode=base_mode)
-            selected_ds = ds.sel(
-                time=slice(f"{year}-{period_start}", f"{year}-{period_end}")
+        years = range(base_start_year, base_end_year + 1)
+        for year, ds in iter_period_data([variable], years, base_mode):
+            seasons.append(
+                ds.sel(time=slice(f"{year}-{period_start}", f"{year}-{period_end}"))
             )
-            datesets.append(selected_ds)
-    return xr.concat(datesets, dim="time", coords="minimal")
+
+    cube = xr.concat(seasons, dim="time", coords="minimal")
+    if fits_in_memory(cube.nbytes):
+        info(f"Loading base period {variable} {base_start_year}-{base_end_year}")
+        cube = cube.load()
+        for name in cube.data_vars:
+            cube[name].values.flags.writeable = False
+
+    base_period_cache[variable] = cube
+    return cube
+
+
+def merge_base_years_period(var_list: Union[list[str], str]) -> xr.Dataset:
+    if isinstance(var_list, str):
+        var_list = [var_list]
+
+    datesets = [load_base_period(var) for var in var_list]
+    if len(datesets) == 1:
+        return datesets[0]
+    return xr.merge(datesets)
 
 
 def get_origin_result_data_path(variable: str):
@@ -241,6 +873,67 @@ def get_origin_result_data_path(variable: str):
     return f"{result_data_dir}/{variable}_{mode}.csv"
 
 
+def get_result_fingerprint_store(local_mode: str = mode) -> FingerprintStore:
+    return FingerprintStore(
+        f"{get_origin_result_data_path(local_mode=local_mode)}/fingerprints.json"
+    )
+
+
+def get_indictor_inputs(module, local_mode: str = mode) -> tuple[list[str], callable]:
+    # 输入变量和逐季节计算函数可能随情景变化（如 hur），由 get_mode_inputs 给出
+    if hasattr(module, "get_mode_inputs"):
+        return module.get_mode_inputs(local_mode)
+    return module.input_variables, getattr(module, f"process_{module.indicator_name}")
+
+
+def uses_base_period(module) -> bool:
+    # 阈值类指标在 before_process 中读取基准期数据，结果经 shared_state 共享
+    return hasattr(module, "before_process") or hasattr(module, "shared_state")
+
+
+def get_indictor_fingerprint(module, local_mode: str = mode) -> str:
+    """Fingerprint of an indicator's code, run parameters and daily inputs.
+
+    Daily inputs count with their current source files. Base-period inputs
+    count only for indicators that read the base period.
+    """
+    inputs = {}
+    variables = []
+    if hasattr(module, "input_variables"):
+        variables, _ = get_indictor_inputs(module, local_mode)
+    periods = [(local_mode, range(start_year, end_year + 1))]
+    base = None
+    if uses_base_period(module):
+        periods.append((base_mode, range(base_start_year, base_end_year + 1)))
+        base = [base_mode, base_start_year, base_end_year]
+    for variable in variables:
+        for input_mode, years in periods:
+            validation = get_daily_store_stats(variable, input_mode)
+            sources = get_daily_store_sources(variable, input_mode)
+            for year in years:
+                stats = validation.get(str(year))
+                source = get_daily_source_fingerprint(variable, year, input_mode)
+                # 源文件已变化时缓存的日数据过期，指标重算时按新源文件重新生成
+                if sources.get(str(year)) not in (None, source):
+                    stats = None
+                inputs[f"{variable}_{input_mode}_{year}"] = [stats, source]
+
+    return hash_value(
+        {
+            "code": get_code_fingerprint(module),
+            "mode": local_mode,
+            "years": [start_year, end_year],
+            "base": base,
+            "period": [period_start, period_end],
+            "regions": country_list,
+            "region_weight": [region_weight_fractional, region_weight_area],
+            "crop": get_crop(),
+            "cmip6": [cmip6_model_list, deltachange_methods, cmip6_ensemble_spread],
+            "inputs": inputs,
+        }
+    )
+
+
 def get_result_data(variable: str, year: str = None):
     df = pd.read_csv(get_origin_result_data_path(variable))
     if year is None:
@@ -249,16 +942,20 @@ def get_result_data(variable: str, year: str = None):
     return df[df["year"] == year]
 
 
-def get_intermediate_data_path(variable: str, year: str = None):
+def get_intermediate_data_path(
+    variable: str, year: str = None, local_mode: str = mode
+):
     if Path(intermediate_data_dir).exists() == False:
         Path(intermediate_data_dir).mkdir()
     if year is None:
-        return f"{intermediate_data_dir}/{variable}_{mode}.csv"
-    return f"{intermediate_data_dir}/{variable}_{mode}_{year}.csv"
+        return f"{intermediate_data_dir}/{variable}_{local_mode}.csv"
+    return f"{intermediate_data_dir}/{variable}_{local_mode}_{year}.csv"
 
 
-def get_intermediate_data(variable: str, year: str = None):
-    return pd.read_csv(get_intermediate_data_path(variable, year))
+def get_intermediate_data(variable: str, year: str = None, local_mode: str = mode):
+    if year is None:
+        return pd.read_csv(get_intermediate_data_path(variable, local_mode=local_mode))
+    return get_intermediate_store(local_mode).read(variable, year)
 
 
 era5_variables = {
@@ -271,20 +968,74 @@ era5_variables = {
 }
 
 
+# 逐小时数据聚合为日值的方式，未列出的变量取日平均
+era5_daily_statistics = {
+    "tasmin": "min",
+    "tasmax": "max",
+}
+
+
+def get_steps_per_day(times: np.ndarray) -> int:
+    if len(times) < 2:
+        return 1
+    step = np.median(np.diff(times)).astype("timedelta64[s]").astype(int)
+    return max(1, round(24 * 3600 / step))
+
+
+def aggregate_daily(
+    ds: xr.Dataset, how: str, time_variable: str = "valid_time", offset: int = 0
+) -> xr.Dataset:
+    """Aggregate sub-daily data to days with ``how`` (min/max/mean/sum).
+
+    Timestamps are shifted by ``offset`` hours before being split into days.
+    The series is padded to whole days and reduced in (day, step) blocks, so
+    every dask chunk covers complete days; days missing some steps (e.g. the
+    ends of a shifted year) are dropped with a warning. Daily input is only
+    floored to dates.
+    """
+    ds = ds.sortby(time_variable)
+    times = ds[time_variable].values
+    steps = get_steps_per_day(times)
+    if steps == 1:
+        return ds.assign_coords(
+            {time_variable: ds[time_variable].dt.floor("D").values}
+        )
+
+    times = times + np.timedelta64(offset, "h")
+    ds = ds.assign_coords({time_variable: times})
+    first = times.min().astype("datetime64[D]")
+    last = times.max().astype("datetime64[D]")
+    step = np.timedelta64(24 * 3600 // steps, "s")
+    full_times = np.arange(
+        first.astype("datetime64[s]"), (last + 1).astype("datetime64[s]"), step
+    ).astype("datetime64[ns]")
+    days = len(full_times) // steps
+    ds = ds.reindex({time_variable: full_times}).chunk(
+        {time_variable: steps * min(days, 31)}
+    )
+    ds = getattr(ds.coarsen({time_variable: steps}), how)(keep_attrs=True)
+    ds = ds.assign_coords(
+        {time_variable: np.arange(first, last + 1).astype("datetime64[ns]")}
+    )
+
+    # 不足一整天的时次会使日值偏差，直接去掉
+    counts = np.bincount((times.astype("datetime64[D]") - first).astype(int))
+    complete = counts >= steps
+    if not complete.all():
+        dropped = ds[time_variable].values[~complete].astype("datetime64[D]")
+        warn(f"dropping {len(dropped)} incomplete days: {dropped.tolist()}")
+        ds = ds.isel({time_variable: np.flatnonzero(complete)})
+    return ds
+
+
 def convert_era5_to_cf_daily(ds: xr.Dataset, variable: str) -> xr.Dataset:
     time_variable = "valid_time"
-    if variable == "tasmin" or variable == "tasmax":
-        ds = (
-            ds.chunk({"valid_time": 100})
-            .sortby("valid_time")
-            .groupby("valid_time.date")
-        )
-        if variable == "tasmin":
-            ds = ds.min(dim="valid_time")
-        else:
-            ds = ds.max(dim="valid_time")
-        ds["date"] = pd.to_datetime(ds["date"])
-        time_variable = "date"
+    ds = aggregate_daily(
+        ds,
+        era5_daily_statistics.get(variable, "mean"),
+        time_variable=time_variable,
+        offset=era5_time_zone_offset,
+    )
 
     if variable == "pr" and ds[era5_variables[variable]].attrs["units"] == "m":
         ds[era5_variables[variable]] = ds[era5_variables[variable]] * 1000 * 24
@@ -318,64 +1069,40 @@ def add_unit_for_cmip6(ds: xr.Dataset, variable: str) -> xr.Dataset:
     return ds
 
 
-def max_by_gdf(da: xr.DataArray, gdf: gpd.GeoDataFrame) -> pd.DataFrame:
-    da = da.load().astype(float)
-    da = da.rio.write_crs(gdf.crs)
-    da = da.rio.set_spatial_dims(x_dim="lon", y_dim="lat")
-    averages = []
-    for _, region in gdf.iterrows():
-        if region["name"] not in country_list:
-            continue
-        try:
-            clipped = da.rio.clip([region.geometry])
-            mean_value = clipped.max(dim=["lat", "lon"], skipna=True)
-            if isinstance(mean_value.values, list):
-                if len(mean_value.values) != 1:
-                    error(
-                        f"error for mean value length not equal to 1 for region {region["name"]}"
-                    )
-                averages.append({"name": region["name"], "value": mean_value.values[0]})
-            else:
-                averages.append({"name": region["name"], "value": mean_value.values})
+def reduce_by_regions(
+    da: xr.DataArray, regions: list, how: str = "mean"
+) -> pd.DataFrame:
+    names = [region["name"] for region in regions]
+    geometries = [region.geometry for region in regions]
+    weight = get_region_weight(
+        da["lat"].values,
+        da["lon"].values,
+        names,
+        geometries,
+        fractional=region_weight_fractional,
+        area_weight=region_weight_area,
+    )
+    with profile("reduce_by_regions", indictor=da.name, how=how):
+        values = np.asarray(da.transpose(..., "lat", "lon").values, dtype=float)
+        if how == "mean":
+            # 与逐县裁剪一致：先做空间平均，再对其余维度取平均
+            result = region_mean(values, weight).mean(axis=1)
+        else:
+            result = region_max(values, weight).max(axis=1)
 
-        except Exception as e:
-            error(region["name"], "error:", e)
-            continue
+    return pd.DataFrame({"name": names, "value": result})
 
-    results_df = pd.DataFrame(averages)
-    return results_df
 
+def filter_regions(gdf: gpd.GeoDataFrame) -> list:
+    return [region for _, region in gdf.iterrows() if region["name"] in country_list]
 
-def mean_by_gdf(da: xr.DataArray, gdf: gpd.GeoDataFrame) -> pd.DataFrame:
-    da = da.load().astype(float)
-    da = da.rio.write_crs(gdf.crs)
-    da = da.rio.set_spatial_dims(x_dim="lon", y_dim="lat")
-    averages = []
-    for _, region in gdf.iterrows():
-        if region["name"] not in country_list:
-            continue
-        try:
-            clipped = da.rio.clip([region.geometry])
-            mean_value = clipped.mean(dim=["lat", "lon"], skipna=True)
-            if isinstance(mean_value.values, list):
-                if len(mean_value.values) != 1:
-                    error(
-                        f"error for mean value length not equal to 1 for region {region["name"]}"
-                    )
-                averages.append({"name": region["name"], "value": mean_value.values[0]})
-            elif isinstance(mean_value.values, np.ndarray):
-                averages.append(
-                    {"name": region["name"], "value": mean_value.values.mean()}
-                )
-            else:
-                averages.append({"name": region["name"], "value": mean_value.values})
 
-        except Exception as e:
-            error(region["name"], "error:", e)
-            continue
+def max_by_gdf(da: xr.DataArray, gdf: gpd.GeoDataFrame) -> pd.DataFrame:
+    return reduce_by_regions(da, filter_regions(gdf), how="max")
 
-    results_df = pd.DataFrame(averages)
-    return results_df
+
+def mean_by_gdf(da: xr.DataArray, gdf: gpd.GeoDataFrame) -> pd.DataFrame:
+    return reduce_by_regions(da, filter_regions(gdf), how="mean")
 
 
 gdf_list = []
@@ -390,20 +1117,24 @@ def get_gdf_list():
     return gdf_list
 
 
-def mean_by_region(da: xr.DataArray) -> pd.DataFrame:
-    df_list = []
+region_list = []
+
+
+def get_region_list():
+    if len(region_list) != 0:
+        return region_list
     for gdf in get_gdf_list():
-        df_list.append(mean_by_gdf(da, gdf))
+        region_list.extend(filter_regions(gdf))
 
-    return pd.concat(df_list, ignore_index=True)
+    return region_list
 
 
-def max_by_region(da: xr.DataArray) -> pd.DataFrame:
-    df_list = []
-    for gdf in get_gdf_list():
-        df_list.append(max_by_gdf(da, gdf))
+def mean_by_region(da: xr.DataArray) -> pd.DataFrame:
+    return reduce_by_regions(da, get_region_list(), how="mean")
 
-    return pd.concat(df_list, ignore_index=True)
+
+def max_by_region(da: xr.DataArray) -> pd.DataFrame:
+    return reduce_by_regions(da, get_region_list(), how="max")
 
 
 def generate_region_map():
@@ -429,53 +1160,28 @@ def find_region_by_name(name: str) -> gpd.GeoDataFrame:
                 return region
 
 
-def reindex_ds_to_all_year(ds: xr.Dataset, default_value, full_year=True):
-    times = ds["time"].dt.floor("D").values
-    duration = pd.to_timedelta(times.max() - times.min())
-    year = pd.to_datetime(times.max()).year
-    start_time = datetime.fromisoformat(f"{year}-01-01")
-    end_time = start_time + duration
-    ds = ds.assign_coords(time=pd.date_range(start=start_time, end=end_time, freq="D"))
-    if full_year:
-        ds = ds.reindex(
-            time=pd.date_range(start=f"{year}-01-01", end=f"{year}-12-31", freq="D"),
-            fill_value=default_value,
+def merge_intermediate_post_process(variable_name: str, local_mode: str = mode):
+    store = get_intermediate_store(local_mode)
+    with profile("merge_intermediate", indictor=variable_name + "_post_process"):
+        df = store.read_years(
+            variable_name + "_post_process", range(start_year + 1, end_year + 1)
         )
-    return ds
-
-
-def merge_intermediate_post_process(variable_name: str):
-    df_list = []
-    for year in range(start_year + 1, end_year + 1):
-        csv_path = get_intermediate_data_path(variable_name + "_post_process", year)
-        df = pd.read_csv(csv_path)
-        df["year"] = year
-        df.set_index(["year", "name"])
-        df_list.append(df)
-
-    df = pd.concat(df_list)
-    df.to_csv(get_intermediate_data_path(variable_name + "_post_process"))
+        store.write_merged(variable_name + "_post_process", df)
     df.set_index(["year", "name"], inplace=True)
     return df
 
 
-def merge_intermediate(variable_name: str):
-    df_list = []
-    for year in range(start_year + 1, end_year + 1):
-        csv_path = get_intermediate_data_path(variable_name, year)
-        df = pd.read_csv(csv_path)
-        df["year"] = year
-        df.set_index(["year", "lat", "lon"])
-        df_list.append(df)
-
-    df = pd.concat(df_list)
-    df.to_csv(get_intermediate_data_path(variable_name))
+def merge_intermediate(variable_name: str, local_mode: str = mode):
+    store = get_intermediate_store(local_mode)
+    with profile("merge_intermediate", indictor=variable_name):
+        df = store.read_years(variable_name, range(start_year + 1, end_year + 1))
+        store.write_merged(variable_name, df)
     df.set_index(["year", "lat", "lon"], inplace=True)
     return df
 
 
-def get_origin_result_data_path(variable: str = None):
-    return get_origin_result_data_path_by_mode(variable, mode)
+def get_origin_result_data_path(variable: str = None, local_mode: str = mode):
+    return get_origin_result_data_path_by_mode(variable, local_mode)
 
 
 def get_origin_result_data_path_by_mode(
@@ -489,8 +1195,13 @@ def get_origin_result_data_path_by_mode(
     return f"{result_data_dir}/origin_{local_mode}/{variable}.csv"
 
 
-def get_outlier_result_data_path(variable: str = None) -> str:
-    return get_outlier_result_data_path_by_mode(variable, mode)
+def get_origin_result_cube_path(variable: str, local_mode: str = mode) -> str:
+    # 不含扩展名，数组为 .npy，坐标为 .json
+    return f"{get_origin_result_data_path_by_mode(local_mode=local_mode)}/{variable}"
+
+
+def get_outlier_result_data_path(variable: str = None, local_mode: str = mode) -> str:
+    return get_outlier_result_data_path_by_mode(variable, local_mode)
 
 
 def get_outlier_result_data_path_by_mode(
@@ -503,8 +1214,10 @@ def get_outlier_result_data_path_by_mode(
         return f"{result_data_dir}/outlier_{local_mode}"
     return f"{result_data_dir}/outlier_{local_mode}/{variable}.csv"
 
-def get_delta_change_result_data_path(variable: str = None) -> str:
-    return get_delta_change_result_data_path_by_mode(variable, mode)
+def get_delta_change_result_data_path(
+    variable: str = None, local_mode: str = mode
+) -> str:
+    return get_delta_change_result_data_path_by_mode(variable, local_mode)
 
 
 def get_delta_change_result_data_path_by_mode(
@@ -517,6 +1230,20 @@ def get_delta_change_result_data_path_by_mode(
         return f"{result_data_dir}/delta_change_{local_mode}"
     return f"{result_data_dir}/delta_change_{local_mode}/{variable}.csv"
 
+
+def get_trend_result_data_path(variable: str = None, local_mode: str = mode) -> str:
+    if Path(result_data_dir + f"/trend_{local_mode}").exists() == False:
+        Path(result_data_dir + f"/trend_{local_mode}").mkdir()
+
+    if variable is None:
+        return f"{result_data_dir}/trend_{local_mode}"
+    return f"{result_data_dir}/trend_{local_mode}/{variable}.csv"
+
+
+def get_grid_trend_path(local_mode: str = mode) -> str:
+    return f"{get_trend_result_data_path(local_mode=local_mode)}/grid.zarr"
+
+
 def get_git_commit_id():
     import subprocess
     try: